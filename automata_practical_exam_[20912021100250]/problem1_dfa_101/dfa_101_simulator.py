@@ -1,34 +1,1054 @@
 # dfa_101_simulator.py
+import binascii
+import mmap
+import multiprocessing
+import os
+from collections import deque
+from itertools import chain
 
-def dfa_accepts_101(input_string):
-    current_state = 'q0'
-    for char in input_string:
-        if current_state == 'q0':
-            if char == '0':
-                current_state = 'q0'
-            elif char == '1':
-                current_state = 'q1'
-            else: # Should not happen with binary strings
-                return False 
-        elif current_state == 'q1':
-            if char == '0':
-                current_state = 'q2'
-            elif char == '1':
-                current_state = 'q1'
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only the batch API needs it
+    np = None
+
+# Largest transition monoid whose elements still fit in one hex digit for the unhexlify reduction.
+_MAX_MONOID = 16
+# Largest (states x 256) table built for the packed-byte scan.
+_MAX_PACKED_TABLE = 1 << 16
+# Inputs shorter than this run on the plain per-symbol loop.
+_MIN_REDUCE = 64
+# Long inputs are processed in slices of this many symbols, so extra memory stays constant.
+CHUNK_SIZE = 1 << 20
+# Size of the first slice; slices double up to CHUNK_SIZE, so early exits only pay for a short prefix.
+_FIRST_PIECE = 256
+
+
+class DFA:
+    def __init__(self, states, alphabet, transitions, start_state, accept_states, absorb_invalid=False):
+        # absorb_invalid: states that loop on every symbol of the alphabet also skip symbols
+        # outside it, instead of moving to the dead state like every other state does.
+        self.states = set(states)
+        self.alphabet = set(alphabet)
+        self._transitions = transitions
+        self.start_state = start_state
+        self.accept_states = set(accept_states)
+        self.absorb_invalid = absorb_invalid
+
+        if start_state not in self.states:
+            raise ValueError(f"Start state '{start_state}' is not in defined states.")
+        for state in self.accept_states:
+            if state not in self.states:
+                raise ValueError(f"Accept state '{state}' is not in defined states.")
+        for symbol in self.alphabet:
+            if not isinstance(symbol, str) or len(symbol) != 1:
+                raise ValueError(f"Symbol {symbol!r} must be a single character.")
+        for state_from, rules in transitions.items():
+            if state_from not in self.states:
+                raise ValueError(f"State '{state_from}' in transitions is not in defined states.")
+            for symbol, state_to in rules.items():
+                if symbol not in self.alphabet:
+                    raise ValueError(f"Symbol '{symbol}' in transition from '{state_from}' "
+                                     f"is not in the alphabet.")
+                if state_to not in self.states:
+                    raise ValueError(f"State '{state_to}' in transition from '{state_from}' "
+                                     f"on '{symbol}' is not in defined states.")
+        self._compile()
+
+    def _compile(self):
+        # States become 0..n-1 (start first) plus an implicit dead state n; symbols become
+        # classes 0..k-1 plus an "invalid symbol" class k. Missing transitions and invalid
+        # symbols both lead to the dead state, which never accepts (see absorb_invalid).
+        others = sorted((s for s in self.states if s != self.start_state), key=str)
+        state_names = [self.start_state] + others
+        state_index = {name: i for i, name in enumerate(state_names)}
+        symbols = sorted(self.alphabet)
+        symbol_class = {sym: i for i, sym in enumerate(symbols)}
+
+        n = len(state_names)
+        rows = [[n] * len(symbols) for _ in range(n)]
+        for state_from, rules in self._transitions.items():
+            row = rows[state_index[state_from]]
+            for symbol, state_to in rules.items():
+                row[symbol_class[symbol]] = state_index[state_to]
+        self._load(state_names, symbols, rows, [name in self.accept_states for name in state_names])
+
+    @classmethod
+    def from_table(cls, state_names, symbols, rows, accepting, absorb_invalid=False):
+        # Builds a machine straight from integer rows, skipping the dict form: state 0 is the start
+        # state, rows[s][c] is the successor of state s on symbols[c], and len(state_names) stands
+        # for the dead state. A row may also end with its successor on invalid symbols. Used by
+        # the builders below, which produce tables directly.
+        dfa = cls.__new__(cls)
+        dfa.states = set(state_names)
+        dfa.alphabet = set(symbols)
+        dfa._transitions = None
+        dfa.start_state = state_names[0]
+        dfa.accept_states = {name for name, accept in zip(state_names, accepting) if accept}
+        dfa.absorb_invalid = absorb_invalid
+        dfa._load(list(state_names), list(symbols), rows, list(accepting))
+        return dfa
+
+    def _load(self, state_names, symbols, rows, accepting):
+        self.state_names = state_names
+        self.state_index = {name: i for i, name in enumerate(state_names)}
+        self.symbols = symbols
+        self.symbol_class = {sym: i for i, sym in enumerate(symbols)}
+
+        n, k = len(state_names), len(symbols)
+        self.dead = n
+        self.invalid_class = k
+        self.width = k + 1
+        table = []
+        for s, row in enumerate(rows):
+            table.extend(row)
+            # Opt-in: a state that loops on every symbol of the alphabet also ignores symbols
+            # outside it, so once it is reached the rest of the input never changes the answer.
+            if len(row) == k:
+                table.append(s if self.absorb_invalid and row.count(s) == k else n)
+        table.extend([n] * self.width)
+        self.table = table
+        self.start = 0
+        self.accepting = accepting + [False]
+        self._np_blocks = None
+        self._build_runtime()
+
+    @property
+    def transitions(self):
+        if self._transitions is None:
+            self._transitions = {
+                name: {sym: self.state_names[row[cls]] for sym, cls in self.symbol_class.items()
+                       if row[cls] != self.dead}
+                for name, row in zip(self.state_names, self._rows)}
+        return self._transitions
+
+    def _build_runtime(self):
+        width, num_states = self.width, self.dead + 1
+        self._rows = [self.table[s * width:(s + 1) * width] for s in range(num_states)]
+        self._absorbing = [row.count(s) == width for s, row in enumerate(self._rows)]
+        # Settled states loop on every valid symbol: only an invalid symbol can still move them
+        # (to the dead state), which _settle checks for over the rest of the input in C.
+        self._settled = [row[:-1].count(s) == width - 1 for s, row in enumerate(self._rows)]
+        self._valid_bytes = bytes(ord(sym) for sym in self.symbols if ord(sym) < 256)
+        # When every accepting state is settled, acceptance is permanent once reached up to the
+        # first invalid symbol, which lets first_match bisect with the fast engine instead of
+        # stepping symbol by symbol.
+        self._monotone = all(self._settled[s] for s in range(num_states) if self.accepting[s])
+
+        # Byte -> symbol class, applied to whole inputs with bytes.translate.
+        # (With all 256 bytes in the alphabet no byte is invalid, so the fill value never survives.)
+        classify = bytearray([min(self.invalid_class, 255)]) * 256
+        for sym, cls in self.symbol_class.items():
+            if ord(sym) < 256:
+                classify[ord(sym)] = cls
+        self._classify = bytes(classify)
+
+        # Transition-monoid tables for the translate/unhexlify reduction: every byte maps to the
+        # hex digit of its symbol's transition function, and every pair of hex digits (one byte
+        # after unhexlify) maps to the hex digit of their composition.
+        self._elements = self._transition_monoid()
+        if self._elements is not None:
+            element_id = {f: i for i, f in enumerate(self._elements)}
+            digit = b'0123456789abcdef'
+            class_digit = [digit[element_id[tuple(row[cls] for row in self._rows)]] for cls in range(width)]
+            self._byte_digit = bytes(class_digit[cls] for cls in self._classify)
+            compose = bytearray(b'0') * 256
+            for a, f in enumerate(self._elements):
+                for b, g in enumerate(self._elements):
+                    compose[a << 4 | b] = digit[element_id[tuple(g[s] for s in f)]]
+            self._compose_digit = bytes(compose)
+            # Input made of hex-digit characters skips the first translate: unhexlify reads two
+            # symbols straight into one byte, mapped to their composition by _pair_digit. Only
+            # valid when both cases of every hex letter have the same element (invalid ones do).
+            lower = b'0123456789abcdef'.translate(self._byte_digit)
+            self._pair_digit = None
+            if lower == b'0123456789ABCDEF'.translate(self._byte_digit):
+                value = [int(chr(d), 16) for d in lower]
+                self._pair_digit = bytes(compose[value[byte >> 4] << 4 | value[byte & 15]] for byte in range(256))
+        # Bytes of the symbols that leave each state where it is.
+        self._loop_bytes = [bytes(ord(sym) for sym, cls in self.symbol_class.items()
+                                  if ord(sym) < 256 and row[cls] == s) for s, row in enumerate(self._rows)]
+
+        # Fallback for larger monoids: several symbol classes packed per byte, scanned against a
+        # flat table whose entries are pre-shifted next states (state << 8) so each step is one index.
+        self._per_byte, self._bits = 1, 8
+        bits = max(1, (width - 1).bit_length())
+        if self._elements is None and bits <= 4 and num_states * 256 <= _MAX_PACKED_TABLE:
+            self._per_byte = per_byte = 8 // bits
+            mask = (1 << bits) - 1
+            packed_table = []
+            for s in range(num_states):
+                for byte in range(256):
+                    state = s
+                    for i in range(per_byte):
+                        cls = byte >> (bits * i) & mask
+                        state = self._rows[state][cls] if cls < width else self.dead
+                    packed_table.append(state << 8)
+            self._packed_table = packed_table
+            self._bits = bits
+
+    def _transition_monoid(self):
+        # Every word over the alphabet acts on the states as a function; if there are few
+        # enough distinct functions, each one fits in a hex digit.
+        generators = [tuple(row[cls] for row in self._rows) for cls in range(self.width)]
+        elements = list(dict.fromkeys(generators))
+        if len(elements) > _MAX_MONOID:
+            return None
+        seen = set(elements)
+        for f in elements:
+            for g in generators:
+                h = tuple(g[s] for s in f)
+                if h not in seen:
+                    if len(elements) == _MAX_MONOID:
+                        return None
+                    seen.add(h)
+                    elements.append(h)
+        return elements
+
+    def _pieces(self, data):
+        # Slices of the input in doubling sizes up to CHUNK_SIZE: str slices, or bytes copied out
+        # of any buffer (bytearray, memoryview, mmap...) one slice at a time.
+        sequence = data if isinstance(data, (str, bytes)) else memoryview(data).cast('B')
+        start, size = 0, _FIRST_PIECE
+        while start < len(sequence):
+            piece = sequence[start:start + size]
+            yield piece if not isinstance(piece, memoryview) else bytes(piece)
+            start += size
+            size = min(size * 2, CHUNK_SIZE)
+
+    def _run_piece(self, state, piece):
+        if isinstance(piece, str):
+            try:
+                piece = piece.encode('latin-1')
+            except UnicodeEncodeError:
+                return self._run_symbols(state, piece)
+        return self._run_bytes(state, piece)
+
+    def _run(self, state, data):
+        settled = self._settled
+        pieces = self._pieces(data)
+        for piece in pieces:
+            if settled[state]:  # only an invalid symbol left to read can change the outcome
+                return self._settle(state, chain((piece,), pieces))
+            state = self._run_piece(state, piece)
+        return state
+
+    def _settle(self, state, pieces):
+        # Final state of a settled state after the remaining pieces: itself, unless they hold a
+        # symbol outside the alphabet and the state does not absorb those.
+        if self._absorbing[state] or all(map(self._valid, pieces)):
+            return state
+        return self.dead
+
+    def _valid(self, piece):
+        # True when every symbol of the piece is in the alphabet, checked without a Python loop.
+        if isinstance(piece, str):
+            return self.alphabet.issuperset(piece)
+        return len(self._valid_bytes) == 256 or not piece.translate(None, self._valid_bytes)
+
+    def _valid_prefix(self, piece):
+        # Length of the longest prefix of the piece that only holds symbols of the alphabet.
+        if isinstance(piece, str):
+            invalid = set(piece) - self.alphabet
+        else:
+            invalid = set(piece.translate(None, self._valid_bytes))
+        return min(map(piece.find, invalid), default=len(piece))
+
+    def _mapping(self, data):
+        # The transition function of the whole input: entry s is the state reached from state s.
+        # Starting states that have already merged are only run once.
+        mapping = list(range(self.dead + 1))
+        absorbing, settled = self._absorbing, self._settled
+        pieces = self._pieces(data)
+        for piece in pieces:
+            if isinstance(piece, str):
+                try:
+                    piece = piece.encode('latin-1')
+                except UnicodeEncodeError:
+                    pass
+            if self._elements is not None and isinstance(piece, bytes) and len(piece) >= _MIN_REDUCE:
+                function = self._reduce(piece)
+                mapping = [function[s] for s in mapping]
             else:
-                return False
-        elif current_state == 'q2':
-            if char == '0':
-                current_state = 'q0'
-            elif char == '1':
-                current_state = 'q3'
+                ends = {s: self._run_piece(s, piece) for s in set(mapping)}
+                mapping = [ends[s] for s in mapping]
+            if all(settled[s] for s in mapping):
+                valid = all(map(self._valid, pieces))
+                return tuple(s if valid or absorbing[s] else self.dead for s in mapping)
+        return tuple(mapping)
+
+    def _run_bytes(self, state, data):
+        if len(data) < _MIN_REDUCE:
+            rows = self._rows
+            for cls in data.translate(self._classify):
+                state = rows[state][cls]
+            return state
+        # A piece made only of symbols the state loops on is recognized with one C-level delete
+        # (after a cheap look at its start), which costs far less than reducing it.
+        loop = self._loop_bytes[state]
+        if loop and not data[:_MIN_REDUCE].translate(None, loop) and not data.translate(None, loop):
+            return state
+        if self._elements is not None:
+            return self._reduce(data)[state]
+        return self._run_packed(state, data.translate(self._classify))
+
+    def _reduce(self, data):
+        # Pairwise composition of per-symbol transition functions, entirely in C: unhexlify
+        # packs two element digits into one byte and translate maps it to their composition's
+        # digit, halving the input each round until one function for the whole input remains.
+        compose = self._compose_digit
+        tails, digits = [], None
+        if self._pair_digit is not None and len(data) > 1:
+            if len(data) & 1:
+                tails.append(self._byte_digit[data[-1]])
+            try:
+                digits = binascii.unhexlify(memoryview(data)[:len(data) & ~1]).translate(self._pair_digit)
+            except binascii.Error:  # not all hex digits
+                tails, digits = [], None
+        if digits is None:
+            digits = data.translate(self._byte_digit)
+        while len(digits) > 1:
+            if len(digits) & 1:
+                tails.append(digits[-1])
+                digits = memoryview(digits)[:-1]
+            digits = binascii.unhexlify(digits).translate(compose)
+        element = digits[0]
+        for tail in reversed(tails):
+            element = compose[int(chr(element) + chr(tail), 16)]
+        return self._elements[int(chr(element), 16)]
+
+    def _run_packed(self, state, classes):
+        per_byte, bits = self._per_byte, self._bits
+        full = len(classes) - len(classes) % per_byte if per_byte > 1 else 0
+        if full:
+            packed = 0
+            for i in range(per_byte):
+                packed |= int.from_bytes(classes[i:full:per_byte], 'little') << (bits * i)
+            table = self._packed_table
+            offset = state << 8
+            for byte in packed.to_bytes(full // per_byte, 'little'):
+                offset = table[offset | byte]
+            state = offset >> 8
+        rows = self._rows
+        for cls in classes[full:]:
+            state = rows[state][cls]
+        return state
+
+    def _class_chunks(self, data):
+        # Symbol classes of the input one piece at a time: bytes, or a list for text beyond latin-1.
+        for piece in self._pieces(data):
+            if isinstance(piece, str):
+                try:
+                    piece = piece.encode('latin-1')
+                except UnicodeEncodeError:
+                    yield [self.symbol_class.get(char, self.invalid_class) for char in piece]
+                    continue
+            yield piece.translate(self._classify)
+
+    def _run_symbols(self, state, text):
+        rows, symbol_class, invalid = self._rows, self.symbol_class, self.invalid_class
+        for char in text:
+            state = rows[state][symbol_class.get(char, invalid)]
+        return state
+
+    def accepts(self, data):
+        return self.accepting[self._run(self.start, data)]
+
+    def first_match(self, data):
+        # Smallest offset i such that data[:i] is accepted, or None.
+        if self.accepting[self.start]:
+            return 0
+        if not self._monotone:
+            return next(self.find_matches(data), None)
+        state, offset = self.start, 0
+        for piece in self._pieces(data):
+            # A prefix running past a symbol outside the alphabet is only accepted if a shorter
+            # one already was, so the search ends at the first such symbol.
+            valid = self._valid_prefix(piece)
+            truncated, piece = valid < len(piece), piece[:valid]
+            end = self._run_piece(state, piece)
+            if self.accepting[end]:
+                # Halve the piece until the single symbol that reaches acceptance is left.
+                while len(piece) > 1:
+                    half = len(piece) // 2
+                    middle = self._run_piece(state, piece[:half])
+                    if self.accepting[middle]:
+                        piece = piece[:half]
+                    else:
+                        state, offset, piece = middle, offset + half, piece[half:]
+                return offset + 1
+            if truncated or self._settled[end]:
+                return None
+            state, offset = end, offset + len(piece)
+        return None
+
+    def find_matches(self, data):
+        # Every offset i such that data[:i] is accepted, in increasing order.
+        rows, accepting, absorbing = self._rows, self.accepting, self._absorbing
+        state, offset = self.start, 0
+        if accepting[state]:
+            yield 0
+        for classes in self._class_chunks(data):
+            if absorbing[state]:
+                break
+            for cls in classes:
+                state = rows[state][cls]
+                offset += 1
+                if accepting[state]:
+                    yield offset
+                    if absorbing[state]:
+                        break
+        if absorbing[state] and accepting[state]:
+            total = len(data) if isinstance(data, str) else memoryview(data).nbytes
+            yield from range(offset + 1, total + 1)
+
+    def accepts_batch(self, symbols, lengths=None):
+        # symbols: 2-D uint8 matrix, one (padded) string per row; lengths: used prefix of each row.
+        if np is None:
+            raise ImportError("DFA.accepts_batch requires numpy.")
+        symbols = np.asarray(symbols)
+        if symbols.ndim != 2 or symbols.dtype != np.uint8:
+            raise ValueError("symbols must be a 2-D uint8 array.")
+        count, row_width = symbols.shape
+        classes = self._np_classes(symbols).reshape(count, row_width)
+        if lengths is not None:
+            lengths = np.asarray(lengths, dtype=np.intp)
+            if lengths.shape != (count,) or (count and (lengths.min() < 0 or lengths.max() > row_width)):
+                raise ValueError("lengths must give one length per row, between 0 and the row width.")
+            np.copyto(classes, self.width, where=np.arange(row_width) >= lengths[:, None])
+        return self._run_rows(classes)
+
+    def accepts_packed(self, data, lengths):
+        # data: all strings concatenated into one byte buffer; lengths: the length of each one.
+        if np is None:
+            raise ImportError("DFA.accepts_packed requires numpy.")
+        lengths = np.asarray(lengths, dtype=np.intp)
+        flat = self._np_classes(data)
+        if lengths.ndim != 1 or (len(lengths) and lengths.min() < 0) or lengths.sum() != len(flat):
+            raise ValueError("lengths must be non-negative and add up to the size of data.")
+        count = len(lengths)
+        row_width = int(lengths.max()) if count else 0
+        # Row i starts at i * row_width in the padded matrix and at starts[i] in data.
+        shift = np.repeat(np.arange(count) * row_width - (np.cumsum(lengths) - lengths), lengths)
+        classes = np.full((count, row_width), self.width, dtype=flat.dtype)
+        classes.ravel().put(np.arange(len(flat)) + shift, flat)
+        return self._run_rows(classes)
+
+    def _np_classes(self, data):
+        # Byte -> symbol class through bytes.translate, which beats a numpy gather on uint8 data.
+        classes = np.frombuffer(bytearray(data).translate(self._classify), dtype=np.uint8)
+        return classes if self.width < 256 else classes.astype(np.uint16)  # room for the padding class
+
+    def _np_block_table(self):
+        # Table indexed by (state, block of `block` classes), built once per machine. The extra
+        # padding class leaves the state unchanged, so strings can end anywhere inside a block.
+        if self._np_blocks is None:
+            radix = self.width + 1
+            num_states = self.dead + 1
+            block = 1
+            while radix ** (block + 1) <= 256 and num_states * radix ** (block + 1) <= _MAX_PACKED_TABLE:
+                block += 1
+            block_count = radix ** block
+
+            step = np.zeros((num_states, radix), dtype=np.intp)
+            step[:, :self.width] = np.asarray(self.table, dtype=np.intp).reshape(num_states, self.width)
+            step[:, self.width] = np.arange(num_states)
+            block_ids = np.arange(block_count)
+            table = np.repeat(np.arange(num_states)[:, None], block_count, axis=1)
+            for j in range(block):
+                table = step[table, block_ids // radix ** (block - 1 - j) % radix]
+            # Entries are pre-multiplied by the block count, so a state plus a block id indexes the table.
+            self._np_blocks = block, (table * block_count).ravel()
+        return self._np_blocks
+
+    def _run_rows(self, classes):
+        # classes[i, t] is the class of symbol t of string i, or the padding class (which leaves
+        # the state unchanged) past its end. All strings advance in lockstep, one vectorized
+        # gather per block of symbols.
+        block, block_table = self._np_block_table()
+        radix = self.width + 1
+        block_count = radix ** block
+        count, steps = classes.shape
+        full = steps // block
+        # (string, block, symbol) view of the whole blocks, plus one padded partial block if needed.
+        parts = [np.lib.stride_tricks.as_strided(
+            classes, (count, full, block), (classes.strides[0], classes.strides[1] * block,
+                                            classes.strides[1]), writeable=False)]
+        if steps % block:
+            tail = np.full((count, 1, block), self.width, dtype=classes.dtype)
+            tail[:, 0, :steps % block] = classes[:, full * block:]
+            parts.append(tail)
+
+        states = np.full(count, self.start * block_count, dtype=np.intp)
+        for part in parts:
+            blocks = part[:, :, 0].astype(np.uint8 if block_count <= 256 else np.intp)
+            for j in range(1, block):
+                blocks *= radix
+                blocks += part[:, :, j]
+            for row in np.ascontiguousarray(blocks.T):
+                states = block_table.take(states + row)
+        return np.asarray(self.accepting, dtype=bool)[states // block_count]
+
+    def accepts_many(self, strings):
+        # A list of str or bytes-like items, or a numpy 'S' array.
+        if np is None:
+            raise ImportError("DFA.accepts_many requires numpy.")
+        if isinstance(strings, np.ndarray) and strings.dtype.kind == 'S':
+            matrix = strings.view(np.uint8).reshape(len(strings), strings.dtype.itemsize)
+            return self.accepts_batch(matrix, np.char.str_len(strings))
+        items = strings if isinstance(strings, (list, tuple)) else list(strings)
+        try:
+            if all(ord(sym) < 256 for sym in self.symbols):
+                try:
+                    data = ''.join(items).encode('latin-1')
+                except TypeError:  # bytes-like items
+                    data = b''.join(items)
+                lengths = np.fromiter(map(len, items), dtype=np.intp, count=len(items))
+                return self.accepts_packed(data, lengths)
+        except (TypeError, UnicodeEncodeError):  # mixed item types, or symbols beyond latin-1
+            pass
+        return np.array([self.accepts(s) for s in items], dtype=bool)
+
+    def minimize(self):
+        # Hopcroft partition refinement over the reachable states plus the dead state. The block
+        # holding the dead state becomes the implicit dead state of the result; every other block
+        # is named after its lowest-numbered member. The invalid-symbol class is refined like the
+        # others, so states that absorb invalid symbols stay apart from those that do not.
+        width = self.width
+        rows = self._rows
+        reachable = {self.start, self.dead}
+        stack = [self.start]
+        while stack:
+            s = stack.pop()
+            for t in rows[s]:
+                if t not in reachable:
+                    reachable.add(t)
+                    stack.append(t)
+        inverse = [{} for _ in range(width)]
+        for s in reachable:
+            for c, t in enumerate(rows[s]):
+                inverse[c].setdefault(t, []).append(s)
+
+        accept = {s for s in reachable if self.accepting[s]}
+        blocks = [b for b in (accept, reachable - accept) if b]
+        block_of = {s: i for i, b in enumerate(blocks) for s in b}
+        smallest = min(range(len(blocks)), key=lambda i: len(blocks[i]))
+        pending = deque((smallest, c) for c in range(width))
+        queued = set(pending)
+        while pending:
+            splitter, c = pending.popleft()
+            queued.discard((splitter, c))
+            touched = {}
+            for t in blocks[splitter]:
+                for s in inverse[c].get(t, ()):
+                    touched.setdefault(block_of[s], []).append(s)
+            for b, members in touched.items():
+                if len(members) == len(blocks[b]):
+                    continue
+                split = set(members)
+                blocks[b] -= split
+                new = len(blocks)
+                blocks.append(split)
+                for s in split:
+                    block_of[s] = new
+                for d in range(width):
+                    if (b, d) in queued:
+                        item = (new, d)
+                    else:
+                        item = (new, d) if len(split) <= len(blocks[b]) else (b, d)
+                    pending.append(item)
+                    queued.add(item)
+
+        dead_block = block_of[self.dead]
+        if block_of[self.start] == dead_block:  # empty language
+            return DFA.from_table([self.start_state], self.symbols, [[1] * width], [False], self.absorb_invalid)
+        order = sorted((b for b in range(len(blocks)) if b != dead_block),
+                       key=lambda b: (b != block_of[self.start], min(blocks[b])))
+        new_index = {b: i for i, b in enumerate(order)}
+        new_index[dead_block] = len(order)
+        representatives = [min(blocks[b]) for b in order]
+        new_rows = [[new_index[block_of[t]] for t in rows[rep]] for rep in representatives]
+        return DFA.from_table([self.state_names[rep] for rep in representatives], self.symbols,
+                              new_rows, [self.accepting[rep] for rep in representatives],
+                              self.absorb_invalid)
+
+    def complement(self):
+        # Strings over the alphabet that this machine rejects; missing transitions get an explicit
+        # accepting sink (named None), while invalid symbols still lead to the dead state (or stay
+        # where they are, in states that absorb them).
+        n, k = self.dead, len(self.symbols)
+        rows = [row[:k] + [n + 1 if row[k] == n else row[k]] for row in self._rows[:n]] + [[n] * k + [n + 1]]
+        return DFA.from_table(self.state_names + [None], self.symbols, rows,
+                              [not a for a in self.accepting[:n]] + [True]).minimize()
+
+    def intersection(self, other):
+        return self._product(other, lambda a, b: a and b)
+
+    def union(self, other):
+        return self._product(other, lambda a, b: a or b)
+
+    def _product(self, other, combine):
+        # Reachable part of the product automaton over the union of both alphabets, minimized.
+        # States are named (state of self, state of other), with None for a dead component. The
+        # last column pairs up both invalid-symbol columns, so absorbing states keep absorbing.
+        symbols = sorted(set(self.symbols) | set(other.symbols))
+        columns = list(zip([self.symbol_class.get(sym, self.invalid_class) for sym in symbols],
+                           [other.symbol_class.get(sym, other.invalid_class) for sym in symbols]))
+        columns.append((self.invalid_class, other.invalid_class))
+        pairs = [(self.start, other.start)]
+        index = {pairs[0]: 0}
+        rows = []
+        for a, b in pairs:
+            row_a, row_b = self._rows[a], other._rows[b]
+            row = []
+            for col_a, col_b in columns:
+                pair = (row_a[col_a], row_b[col_b])
+                j = index.get(pair)
+                if j is None:
+                    j = index[pair] = len(pairs)
+                    pairs.append(pair)
+                row.append(j)
+            rows.append(row)
+        names = [(self.state_names[a] if a != self.dead else None,
+                  other.state_names[b] if b != other.dead else None) for a, b in pairs]
+        accepting = [combine(self.accepting[a], other.accepting[b]) for a, b in pairs]
+        return DFA.from_table(names, symbols, rows, accepting).minimize()
+
+    __and__ = intersection
+    __or__ = union
+    __invert__ = complement
+
+    def accepts_parallel(self, data, workers=None, chunk_size=None):
+        # Splits the input into chunks, computes each chunk's transition function in a process
+        # pool and composes them in order; the result is identical to accepts(data).
+        if isinstance(data, (str, bytes)):
+            bounds = _chunk_bounds(len(data), workers, chunk_size)
+            chunks = (data[start:end] for start, end in bounds)
+        else:
+            # memoryview slices cannot be pickled, so each chunk is copied out as it is handed over.
+            view = memoryview(data).cast('B')
+            bounds = _chunk_bounds(len(view), workers, chunk_size)
+            chunks = (bytes(view[start:end]) for start, end in bounds)
+        return self._compose_chunks(chunks, len(bounds), workers)
+
+    def accepts_file_parallel(self, path, workers=None, chunk_size=None):
+        # Like accepts_parallel, but every worker maps its own slice of the file, so the
+        # contents are never copied between processes.
+        bounds = _chunk_bounds(os.path.getsize(path), workers, chunk_size)
+        return self._compose_chunks(((path, start, end) for start, end in bounds), len(bounds), workers)
+
+    def _compose_chunks(self, chunks, count, workers):
+        # Chunks are produced lazily, so an in-memory input is sliced only as the pool takes work.
+        state, absorbing = self.start, self._absorbing
+        if count <= 1 or workers == 1:
+            for chunk in chunks:
+                state = _chunk_mapping(chunk, self)[state]
+            return self.accepting[state]
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for mapping in pool.imap(_chunk_mapping, chunks):
+                state = mapping[state]
+                if absorbing[state]:  # leaving the with-block terminates the outstanding chunks
+                    break
+        return self.accepting[state]
+
+    def stream(self):
+        return DFAStream(self)
+
+    def accepts_file(self, path):
+        with open(path, 'rb') as file:
+            return self.stream().feed_file(file).result()
+
+
+# The DFA used by _chunk_mapping in pool workers, installed once per process by _init_worker.
+_worker_dfa = None
+
+
+def _init_worker(dfa):
+    global _worker_dfa
+    _worker_dfa = dfa
+
+
+def _chunk_bounds(length, workers, chunk_size):
+    # (start, end) pairs covering the input; by default a few chunks per worker so that
+    # uneven chunk times still keep every core busy.
+    if chunk_size is None:
+        chunk_size = max(CHUNK_SIZE, -(-length // (4 * (workers or os.cpu_count() or 1))))
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    return [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+
+def _chunk_mapping(chunk, dfa=None):
+    dfa = dfa or _worker_dfa
+    if not isinstance(chunk, tuple):
+        return dfa._mapping(chunk)
+    path, start, end = chunk
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return dfa._mapping(view[start:end])
+            finally:
+                view.release()
+
+
+class DFAStream:
+    # Resumable run of a DFA: the current state is carried from one fed chunk to the next.
+    def __init__(self, dfa):
+        self.dfa = dfa
+        self.state = dfa.start
+        self.consumed = 0
+
+    def feed(self, chunk):
+        self.state = self.dfa._run(self.state, chunk)
+        self.consumed += len(chunk)
+        return self
+
+    def feed_file(self, file):
+        # Regular files are memory-mapped; pipes and other unmappable streams are read in chunks.
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):  # no fileno, not mappable, or empty file
+            mapped = None
+        if mapped is not None:
+            with mapped:
+                return self.feed(mapped)
+        buffer = bytearray(CHUNK_SIZE)
+        while True:
+            count = file.readinto(buffer)
+            if not count:
+                return self
+            self.feed(memoryview(buffer)[:count])
+
+    def result(self):
+        return self.dfa.accepting[self.state]
+
+    @property
+    def state_name(self):
+        return None if self.state == self.dfa.dead else self.dfa.state_names[self.state]
+
+
+class PatternMatcher:
+    # Aho-Corasick automaton for a set of patterns. Trie states are named by their prefix and the
+    # failure links are folded into a complete transition table, so both machines below are
+    # ordinary compiled DFAs:
+    #   scanner - follows the longest pattern prefix ending at each position
+    #   dfa     - same, but states that complete a pattern are absorbing accept states, so
+    #             dfa.accepts(data) answers "contains at least one pattern" at table speed.
+    def __init__(self, patterns, alphabet=None):
+        self.patterns = [p.decode('latin-1') if isinstance(p, (bytes, bytearray)) else p
+                         for p in patterns]
+        if not self.patterns:
+            raise ValueError("At least one pattern is required.")
+        if alphabet is None:  # every byte, so arbitrary binary input is scanned rather than rejected
+            alphabet = {chr(i) for i in range(256)}.union(*self.patterns)
+        symbols = sorted(alphabet)
+        symbol_class = {sym: i for i, sym in enumerate(symbols)}
+        for pattern in self.patterns:
+            for char in pattern:
+                if char not in symbol_class:
+                    raise ValueError(f"Pattern symbol '{char}' is not in the alphabet.")
+
+        names, children, output = [''], [{}], [0]
+        for i, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                cls = symbol_class[char]
+                child = children[node].get(cls)
+                if child is None:
+                    child = len(names)
+                    children[node][cls] = child
+                    names.append(names[node] + char)
+                    children.append({})
+                    output.append(0)
+                node = child
+            output[node] |= 1 << i
+
+        # Breadth-first, so a node's failure target (a shorter prefix) already has its full row.
+        k = len(symbols)
+        rows = [None] * len(names)
+        rows[0] = [0] * k
+        fail = [0] * len(names)
+        for cls, child in children[0].items():
+            rows[0][cls] = child
+        queue = deque(children[0].values())
+        while queue:
+            node = queue.popleft()
+            output[node] |= output[fail[node]]
+            row = rows[fail[node]][:]
+            for cls, child in children[node].items():
+                fail[child] = row[cls]
+                row[cls] = child
+                queue.append(child)
+            rows[node] = row
+
+        accepting = [out != 0 for out in output]
+        self.outputs = output + [0]
+        self.scanner = DFA.from_table(names, symbols, rows, accepting)
+        absorbing = [[s] * k if output[s] else row for s, row in enumerate(rows)]
+        self.dfa = DFA.from_table(names, symbols, absorbing, accepting)
+
+    def matched(self, data):
+        # Patterns occurring anywhere in data, in one pass; stops once every pattern has been seen.
+        everything = (1 << len(self.patterns)) - 1
+        outputs, rows = self.outputs, self.scanner._rows
+        state = self.scanner.start
+        found = outputs[state]
+        for classes in self.scanner._class_chunks(data):
+            if found == everything:
+                break
+            for cls in classes:
+                state = rows[state][cls]
+                if outputs[state]:
+                    found |= outputs[state]
+                    if found == everything:
+                        break
+        return [pattern for i, pattern in enumerate(self.patterns) if found >> i & 1]
+
+
+def create_pattern_dfa(patterns, alphabet=None):
+    return PatternMatcher(patterns, alphabet).dfa
+
+
+class _RegexParser:
+    # Recursive-descent parser for regular expressions over single characters:
+    #   alternation a|b, concatenation, a* a+ a?, grouping (...), any symbol ., classes [abc] [a-z] [^...]
+    #   and backslash escapes. Produces a small tree of tuples:
+    #   ('empty',), ('set', chars, negated), ('cat', a, b, ...), ('alt', a, b, ...), (op, a) for op in '*+?'.
+    # Concatenations and alternations are flat, so the tree is only as deep as the groups are nested.
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+        self.literals = set()
+
+    def parse(self):
+        tree = self._alternation()
+        if self.pos != len(self.pattern):
+            self._error("unbalanced ')'")
+        return tree
+
+    def _error(self, message):
+        raise ValueError(f"Invalid regex {self.pattern!r} at position {self.pos}: {message}.")
+
+    def _peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def _take(self):
+        char = self._peek()
+        if char is None:
+            self._error("unexpected end of pattern")
+        self.pos += 1
+        return char
+
+    def _alternation(self):
+        parts = [self._concatenation()]
+        while self._peek() == '|':
+            self.pos += 1
+            parts.append(self._concatenation())
+        return parts[0] if len(parts) == 1 else ('alt', *parts)
+
+    def _concatenation(self):
+        items = []
+        while self._peek() not in (None, '|', ')'):
+            items.append(self._repetition())
+        if not items:
+            return ('empty',)
+        return items[0] if len(items) == 1 else ('cat', *items)
+
+    def _repetition(self):
+        tree = self._atom()
+        while self._peek() in ('*', '+', '?'):
+            tree = (self._take(), tree)
+        return tree
+
+    def _atom(self):
+        char = self._take()
+        if char == '(':
+            tree = self._alternation()
+            if self._peek() != ')':
+                self._error("missing ')'")
+            self.pos += 1
+            return tree
+        if char == '[':
+            return self._class()
+        if char == '.':
+            return ('set', frozenset(), True)
+        if char in '*+?':
+            self._error(f"nothing to repeat before '{char}'")
+        if char == '\\':
+            char = self._take()
+        self.literals.add(char)
+        return ('set', frozenset(char), False)
+
+    def _class(self):
+        negated = self._peek() == '^'
+        if negated:
+            self.pos += 1
+        chars = set()
+        first = True
+        while first or self._peek() != ']':
+            first = False
+            low = self._take()
+            if low == '\\':
+                low = self._take()
+            high = low
+            if self._peek() == '-' and self.pattern[self.pos + 1:self.pos + 2] not in ('', ']'):
+                self.pos += 1
+                high = self._take()
+                if high == '\\':
+                    high = self._take()
+                if high < low:
+                    self._error(f"bad range {low}-{high}")
+            chars.update(chr(c) for c in range(ord(low), ord(high) + 1))
+        self.pos += 1
+        self.literals.update(chars)
+        return ('set', frozenset(chars), negated)
+
+
+class _SubsetConstruction:
+    # Thompson NFA for a regex tree, determinized on demand: a DFA state (a set of NFA states)
+    # gets an index the first time it is reached, and its row is only computed when asked for,
+    # so subsets that are never reached are never built.
+    def __init__(self, tree, symbols):
+        self.symbols = symbols
+        self.epsilon = []   # NFA state -> states reachable by one epsilon move
+        self.edges = []     # NFA state -> [(label index, target)]
+        self.labels = []    # label index -> set of symbol classes it matches
+        self.nfa_start, self.nfa_accept = self._build(tree)
+
+        # Symbols matched by exactly the same labels behave identically: one move per group.
+        groups = {}
+        for cls, sym in enumerate(symbols):
+            signature = tuple(i for i, label in enumerate(self.labels) if sym in label)
+            groups.setdefault(signature, []).append(cls)
+        self.groups = [(frozenset(signature), classes) for signature, classes in groups.items()]
+
+        self._closures = {}
+        self.subsets = []
+        self.index = {}
+        self.start = self.state(self._closure((self.nfa_start,)))
+
+    def _new_state(self):
+        self.epsilon.append([])
+        self.edges.append([])
+        return len(self.epsilon) - 1
+
+    def _build(self, tree):
+        # Returns the (start, accept) pair of the fragment for tree.
+        kind = tree[0]
+        if kind in ('empty', 'set'):
+            start, accept = self._new_state(), self._new_state()
+            if kind == 'empty':
+                self.epsilon[start].append(accept)
             else:
-                return False
-        elif current_state == 'q3':
-            pass # Stays in accept state
-        # No need for an else here if states are q0, q1, q2, q3
-            
-    return current_state == 'q3'
+                chars, negated = tree[1], tree[2]
+                self.labels.append({s for s in self.symbols if (s in chars) != negated})
+                self.edges[start].append((len(self.labels) - 1, accept))
+            return start, accept
+        if kind == 'cat':
+            start, accept = self._build(tree[1])
+            for part in tree[2:]:
+                part_start, part_accept = self._build(part)
+                self.epsilon[accept].append(part_start)
+                accept = part_accept
+            return start, accept
+        start, accept = self._new_state(), self._new_state()
+        if kind == 'alt':
+            for part in tree[1:]:
+                part_start, part_accept = self._build(part)
+                self.epsilon[start].append(part_start)
+                self.epsilon[part_accept].append(accept)
+            return start, accept
+        inner_start, inner_accept = self._build(tree[1])
+        self.epsilon[start].append(inner_start)
+        self.epsilon[inner_accept].append(accept)
+        if kind in ('*', '?'):
+            self.epsilon[start].append(accept)
+        if kind in ('*', '+'):
+            self.epsilon[inner_accept].append(inner_start)
+        return start, accept
+
+    def _closure(self, nfa_states):
+        key = frozenset(nfa_states)
+        closure = self._closures.get(key)
+        if closure is None:
+            seen = set(key)
+            stack = list(key)
+            while stack:
+                for target in self.epsilon[stack.pop()]:
+                    if target not in seen:
+                        seen.add(target)
+                        stack.append(target)
+            closure = self._closures[key] = frozenset(seen)
+        return closure
+
+    def state(self, subset):
+        # Index of a DFA state; None for the empty subset (the dead state).
+        if not subset:
+            return None
+        index = self.index.get(subset)
+        if index is None:
+            index = self.index[subset] = len(self.subsets)
+            self.subsets.append(subset)
+        return index
+
+    def row(self, index):
+        row = [None] * len(self.symbols)
+        subset = self.subsets[index]
+        for labels, classes in self.groups:
+            moved = [target for s in subset for label, target in self.edges[s] if label in labels]
+            successor = self.state(self._closure(moved))
+            for cls in classes:
+                row[cls] = successor
+        return row
+
+    def accepting(self, index):
+        return self.nfa_accept in self.subsets[index]
+
+
+def compile_regex(pattern, alphabet=None, minimize=True):
+    # Regex -> Thompson NFA -> DFA (subset construction over the reachable subsets only) -> minimal DFA,
+    # in the same compiled table format as hand-written machines. The whole input must match.
+    # Without an alphabet, the symbols mentioned in the pattern are used ('.' and [^...] range over it).
+    parser = _RegexParser(pattern)
+    tree = parser.parse()
+    symbols = sorted(parser.literals if alphabet is None else alphabet)
+    for symbol in symbols:
+        if not isinstance(symbol, str) or len(symbol) != 1:
+            raise ValueError(f"Symbol {symbol!r} must be a single character.")
+    subsets = _SubsetConstruction(tree, symbols)
+    rows = []
+    while len(rows) < len(subsets.subsets):  # rows of newly reached subsets, in discovery order
+        rows.append(subsets.row(len(rows)))
+    dead = len(rows)
+    rows = [[dead if t is None else t for t in row] for row in rows]
+    accepting = [subsets.accepting(i) for i in range(dead)]
+    dfa = DFA.from_table([f'q{i}' for i in range(dead)], symbols, rows, accepting)
+    return dfa.minimize() if minimize else dfa
+
+
+def create_dfa_101():
+    states = {'q0', 'q1', 'q2', 'q3'}
+    alphabet = {'0', '1'}
+    start_state = 'q0'
+    accept_states = {'q3'}
+
+    transitions = {
+        'q0': {'0': 'q0', '1': 'q1'},
+        'q1': {'0': 'q2', '1': 'q1'},
+        'q2': {'0': 'q0', '1': 'q3'},
+        'q3': {'0': 'q3', '1': 'q3'}  # Stays in accept state
+    }
+    # Once '101' has been seen the rest of the input is skipped, whatever it contains.
+    return DFA(states, alphabet, transitions, start_state, accept_states, absorb_invalid=True)
+
+
+DFA_101 = create_dfa_101()
+
+
+def dfa_accepts_101(input_string, workers=1):
+    if workers == 1:
+        return DFA_101.accepts(input_string)
+    return DFA_101.accepts_parallel(input_string, workers)
 
 if __name__ == "__main__":
     test_inputs = {
@@ -50,16 +1070,16 @@ if __name__ == "__main__":
         if not all(c in '01' for c in s): # Basic validation for binary string
             print(f"Input '{s}': Invalid characters. Skipping.")
             continue
-        
+
         actual_result = dfa_accepts_101(s)
         status = "PASS" if actual_result == expected_result else "FAIL"
         if actual_result != expected_result:
             all_passed = False
-        
+
         print(f"Input: '{s}', Expected: {'Accepted' if expected_result else 'Rejected'}, Got: {'Accepted' if actual_result else 'Rejected'} - {status}")
 
     if all_passed:
         print("\nAll predefined tests passed!")
     else:
         print("\nSome predefined tests failed.")
-    print("--------------------------------------")
\ No newline at end of file
+    print("--------------------------------------")
@@ -0,0 +1,352 @@
+# test_dfa_101_simulator.py
+import io
+import itertools
+import os
+import random
+import re
+import tempfile
+import unittest
+from dfa_101_simulator import (
+    CHUNK_SIZE,
+    DFA,
+    PatternMatcher,
+    compile_regex,
+    create_dfa_101,
+    create_pattern_dfa,
+    dfa_accepts_101
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def create_mod_dfa(k):
+    states = {f'r{i}' for i in range(k)}
+    transitions = {f'r{i}': {'0': f'r{(2 * i) % k}', '1': f'r{(2 * i + 1) % k}'} for i in range(k)}
+    return DFA(states, {'0', '1'}, transitions, 'r0', {'r0'})
+
+
+class TestDFA101(unittest.TestCase):
+
+    def test_predefined_inputs(self):
+        test_inputs = {
+            "101": True, "001010": True, "1110101": True, "1001": False, "000": False,
+            "1": False, "10": False, "": False, "010010": False, "1010101": True
+        }
+        for s, expected in test_inputs.items():
+            self.assertEqual(dfa_accepts_101(s), expected, f"Input '{s}'")
+
+    def test_long_inputs_match_substring_check(self):
+        rng = random.Random(101)
+        for length in [63, 64, 65, 127, 1000, 4097]:
+            for _ in range(50):
+                s = ''.join(rng.choice('0001') for _ in range(length))
+                self.assertEqual(dfa_accepts_101(s), '101' in s, f"Input of length {length}")
+
+    def test_bytes_like_inputs(self):
+        self.assertTrue(dfa_accepts_101(b'00101'))
+        self.assertTrue(dfa_accepts_101(bytearray(b'1101')))
+        self.assertFalse(dfa_accepts_101(memoryview(b'1001')))
+
+    def test_invalid_symbols_reject(self):
+        self.assertFalse(dfa_accepts_101("10x1"))
+        self.assertFalse(dfa_accepts_101("1" * 100 + "☃" + "101"))
+        self.assertFalse(dfa_accepts_101("0" * 100 + "2" + "101"))
+
+    def test_accept_state_absorbs_rest_of_input(self):
+        # Like the original q3 branch, nothing after the first '101' is inspected.
+        self.assertTrue(dfa_accepts_101("101x"))
+        self.assertTrue(dfa_accepts_101(b"0101" + bytes(range(256)) * 4096))
+        self.assertFalse(dfa_accepts_101("10x101"))
+        minimal = create_dfa_101().minimize()
+        self.assertTrue(minimal.accepts("101x"))
+        self.assertFalse(minimal.accepts("10x101"))
+
+    def test_first_match_and_find_matches(self):
+        dfa = create_dfa_101()
+        rng = random.Random(19)
+        for length in [0, 5, 300, 5000]:
+            s = ''.join(rng.choice('0001') for _ in range(length))
+            position = s.find('101')
+            expected = None if position < 0 else position + 3
+            self.assertEqual(dfa.first_match(s), expected)
+            self.assertEqual(dfa.first_match(s.encode()), expected)
+            self.assertEqual(list(dfa.find_matches(s)), [] if expected is None else list(range(expected, length + 1)))
+        self.assertEqual(dfa.first_match("0" * 1000 + "2101"), None)
+
+        matcher = PatternMatcher(['ab', 'ba'], alphabet='abc')
+        self.assertEqual(list(matcher.scanner.find_matches('cabac')), [3, 4])
+        self.assertEqual(matcher.scanner.first_match('ccba'), 4)
+        self.assertEqual(matcher.dfa.first_match('ccba'), 4)
+        self.assertEqual(create_mod_dfa(3).first_match('1011'), 0)
+
+    def test_compiled_table(self):
+        dfa = create_dfa_101()
+        self.assertEqual(dfa.state_names[dfa.start], 'q0')
+        self.assertEqual(len(dfa.table), (len(dfa.states) + 1) * dfa.width)
+        q3 = dfa.state_index['q3']
+        self.assertTrue(dfa.accepting[q3])
+        self.assertFalse(dfa.accepting[dfa.dead])
+
+    def test_large_monoid_fallback(self):
+        rng = random.Random(5)
+        for k in [3, 5, 17]:
+            dfa = create_mod_dfa(k)
+            for length in [0, 7, 64, 65, 500]:
+                s = ''.join(rng.choice('01') for _ in range(length))
+                self.assertEqual(dfa.accepts(s), (int(s, 2) if s else 0) % k == 0)
+
+    def test_stream_carries_state_across_chunks(self):
+        dfa = create_dfa_101()
+        stream = dfa.stream()
+        for chunk in [b'1', bytearray(b'0'), memoryview(b'1')]:
+            stream.feed(chunk)
+        self.assertTrue(stream.result())
+        self.assertEqual(stream.state_name, 'q3')
+        self.assertEqual(stream.consumed, 3)
+
+        stream = dfa.stream()
+        rng = random.Random(7)
+        pieces = [''.join(rng.choice('001') for _ in range(rng.randrange(200))) for _ in range(50)]
+        for piece in pieces:
+            stream.feed(piece)
+        self.assertEqual(stream.result(), '101' in ''.join(pieces))
+
+    def test_accepts_file(self):
+        dfa = create_dfa_101()
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(b'1' * (CHUNK_SIZE + 3) + b'0')
+                file.write(b'1' + b'0' * CHUNK_SIZE)
+            self.assertTrue(dfa.accepts_file(path))
+            open(path, 'wb').close()
+            self.assertFalse(dfa.accepts_file(path))
+        finally:
+            os.remove(path)
+
+    def test_feed_unmappable_file(self):
+        data = b'0' * (2 * CHUNK_SIZE + 1) + b'101'
+        self.assertTrue(create_dfa_101().stream().feed_file(io.BytesIO(data)).result())
+        self.assertFalse(create_dfa_101().stream().feed_file(io.BytesIO(data[:-1])).result())
+
+    def test_parallel_matches_sequential(self):
+        rng = random.Random(23)
+        for dfa in [create_dfa_101(), create_mod_dfa(7)]:
+            for length in [0, 1, 999, 5000]:
+                s = ''.join(rng.choice('0001') for _ in range(length))
+                for chunk_size in [1, 7, 256]:
+                    self.assertEqual(dfa.accepts_parallel(s, workers=2, chunk_size=chunk_size), dfa.accepts(s))
+                    self.assertEqual(dfa.accepts_parallel(bytearray(s.encode()), workers=1, chunk_size=chunk_size),
+                                     dfa.accepts(s))
+                for data in (bytearray(s.encode()), memoryview(s.encode())):
+                    self.assertEqual(dfa.accepts_parallel(data, workers=2, chunk_size=700), dfa.accepts(s))
+        self.assertTrue(dfa_accepts_101("0" * 3000 + "101" + "0" * 3000, workers=2))
+        self.assertTrue(dfa_accepts_101(bytearray(b"0" * 3000000 + b"101"), workers=2))
+        self.assertFalse(dfa_accepts_101("1" * 3000 + "☃101", workers=2))
+
+    def test_file_parallel(self):
+        dfa = create_dfa_101()
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(b'0' * 5000 + b'10' + b'1' + b'0' * 100)
+            self.assertTrue(dfa.accepts_file_parallel(path, workers=2, chunk_size=5001))
+            with open(path, 'wb') as file:
+                file.write(b'1001' * 3000)
+            self.assertFalse(dfa.accepts_file_parallel(path, workers=3, chunk_size=1000))
+        finally:
+            os.remove(path)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_accepts_many(self):
+        dfa = create_dfa_101()
+        rng = random.Random(3)
+        strings = [''.join(rng.choice('01') for _ in range(rng.randrange(30))) for _ in range(2000)]
+        expected = ['101' in s for s in strings]
+        self.assertEqual(dfa.accepts_many(strings).tolist(), expected)
+        self.assertEqual(dfa.accepts_many([s.encode() for s in strings]).tolist(), expected)
+        self.assertEqual(dfa.accepts_many(np.array([s.encode() for s in strings])).tolist(), expected)
+        self.assertEqual(dfa.accepts_many(['101', '1☃101', b'0101', bytearray(b'10')]).tolist(),
+                         [True, False, True, False])
+        self.assertEqual(len(dfa.accepts_many([])), 0)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_accepts_batch_and_packed(self):
+        dfa = create_dfa_101()
+        matrix = np.frombuffer(b'10100101x101', dtype=np.uint8).reshape(3, 4)
+        self.assertEqual(dfa.accepts_batch(matrix).tolist(), [True, True, False])
+        self.assertEqual(dfa.accepts_batch(matrix, [2, 4, 3]).tolist(), [False, True, False])
+        self.assertEqual(dfa.accepts_packed(b'1011101', [3, 0, 4]).tolist(), [True, False, True])
+        with self.assertRaises(ValueError):
+            dfa.accepts_batch(matrix, [5, 0, 0])
+        with self.assertRaises(ValueError):
+            dfa.accepts_packed(b'101', [2])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_accepts_many_large_monoid(self):
+        rng = random.Random(9)
+        dfa = create_mod_dfa(7)
+        strings = [''.join(rng.choice('01') for _ in range(rng.randrange(40))) for _ in range(500)]
+        expected = [(int(s, 2) if s else 0) % 7 == 0 for s in strings]
+        self.assertEqual(dfa.accepts_many(strings).tolist(), expected)
+
+    def test_pattern_matcher_reports_every_match(self):
+        rng = random.Random(11)
+        for _ in range(100):
+            patterns = [''.join(rng.choice('ab') for _ in range(rng.randrange(1, 5)))
+                        for _ in range(rng.randrange(1, 6))]
+            matcher = PatternMatcher(patterns, alphabet='abc')
+            for _ in range(10):
+                s = ''.join(rng.choice('abc') for _ in range(rng.randrange(40)))
+                self.assertEqual(matcher.matched(s), [p for p in patterns if p in s], f"{patterns} in '{s}'")
+                self.assertEqual(matcher.dfa.accepts(s), any(p in s for p in patterns))
+
+    def test_pattern_matcher_bytes(self):
+        matcher = PatternMatcher([b'\x00\xff', b'GET ', b'abc'])
+        data = b'xx GET /abc' + bytes(range(256)) + b'\xff'
+        self.assertEqual(matcher.matched(data), ['GET ', 'abc'])
+        self.assertEqual(matcher.matched(b'\x00\xff'), ['\x00\xff'])
+        self.assertTrue(matcher.dfa.accepts(data))
+        self.assertFalse(matcher.dfa.accepts(b'nothing here'))
+
+    def test_pattern_dfa_matches_hand_written_101(self):
+        pattern_dfa = create_pattern_dfa(['101'], alphabet={'0', '1'})
+        rng = random.Random(13)
+        for length in [0, 3, 10, 100, 1000]:
+            s = ''.join(rng.choice('001') for _ in range(length))
+            self.assertEqual(pattern_dfa.accepts(s), dfa_accepts_101(s))
+        self.assertEqual(len(pattern_dfa.states), 4)
+
+    def test_minimize_merges_equivalent_states(self):
+        transitions = {'a': {'0': 'b', '1': 'c'}, 'b': {'0': 'a', '1': 'c'}, 'c': {'0': 'c', '1': 'c'}}
+        minimal = DFA({'a', 'b', 'c'}, {'0', '1'}, transitions, 'a', {'c'}).minimize()
+        self.assertEqual(minimal.state_names, ['a', 'c'])
+        self.assertEqual(minimal.transitions, {'a': {'0': 'a', '1': 'c'}, 'c': {'0': 'c', '1': 'c'}})
+        self.assertEqual(len(create_dfa_101().minimize().states), 4)
+
+    def test_minimize_random_machines(self):
+        rng = random.Random(17)
+        for _ in range(100):
+            names = [f's{i}' for i in range(rng.randrange(1, 7))]
+            transitions = {s: {c: rng.choice(names) for c in 'ab' if rng.random() < 0.8} for s in names}
+            dfa = DFA(set(names), {'a', 'b'}, transitions, 's0', {s for s in names if rng.random() < 0.4})
+            minimal = dfa.minimize()
+            self.assertLessEqual(len(minimal.states), len(names))
+            for length in range(7):
+                for t in map(''.join, itertools.product('ab', repeat=length)):
+                    self.assertEqual(minimal.accepts(t), dfa.accepts(t))
+
+    def test_product_constructions(self):
+        contains_101, divisible_by_3 = create_dfa_101(), create_mod_dfa(3)
+        both = contains_101 & divisible_by_3
+        either = contains_101.union(divisible_by_3)
+        without_101 = ~contains_101
+        self.assertEqual(len(both.states), 12)
+        self.assertEqual(len(without_101.states), 3)
+        for length in range(11):
+            for t in map(''.join, itertools.product('01', repeat=length)):
+                divisible = (int(t, 2) if t else 0) % 3 == 0
+                self.assertEqual(both.accepts(t), '101' in t and divisible)
+                self.assertEqual(either.accepts(t), '101' in t or divisible)
+                self.assertEqual(without_101.accepts(t), '101' not in t)
+        self.assertFalse(without_101.accepts('10x'))
+
+    def test_products_keep_absorbed_invalid_symbols(self):
+        # create_dfa_101 skips everything after '101'; combined machines must answer the same.
+        contains_101, divisible_by_3 = create_dfa_101(), create_mod_dfa(3)
+        self.assertTrue((contains_101 | contains_101).accepts('101x'))
+        self.assertTrue((contains_101 & contains_101).accepts('101x'))
+        both, either, without_101 = contains_101 & divisible_by_3, contains_101 | divisible_by_3, ~contains_101
+        for length in range(7):
+            for t in map(''.join, itertools.product('01x', repeat=length)):
+                self.assertEqual(both.accepts(t), contains_101.accepts(t) and divisible_by_3.accepts(t), t)
+                self.assertEqual(either.accepts(t), contains_101.accepts(t) or divisible_by_3.accepts(t), t)
+                self.assertEqual(without_101.accepts(t), 'x' not in t and not contains_101.accepts(t), t)
+
+    def test_regex_matches_hand_written_101(self):
+        dfa = compile_regex('(0|1)*101(0|1)*')
+        self.assertEqual(len(dfa.states), 4)
+        for length in range(9):
+            for t in map(''.join, itertools.product('01', repeat=length)):
+                self.assertEqual(dfa.accepts(t), dfa_accepts_101(t))
+
+    def test_regex_agrees_with_re(self):
+        rng = random.Random(29)
+
+        def random_regex(depth):
+            choice = rng.randrange(7 if depth else 3)
+            if choice == 0:
+                return rng.choice('abc')
+            if choice == 1:
+                return rng.choice(['.', '[ab]', '[^a]', '[a-b]'])
+            if choice == 2:
+                return ''
+            if choice == 3:
+                return random_regex(depth - 1) + random_regex(depth - 1)
+            if choice == 4:
+                return f'({random_regex(depth - 1)}|{random_regex(depth - 1)})'
+            return f'({random_regex(depth - 1)}){rng.choice("*+?")}'
+
+        for _ in range(200):
+            pattern = random_regex(4)
+            dfa = compile_regex(pattern, alphabet='abc')
+            lazy = compile_regex(pattern, alphabet='abc', minimize=False)
+            self.assertLessEqual(len(dfa.states), len(lazy.states))
+            for _ in range(20):
+                t = ''.join(rng.choice('abc') for _ in range(rng.randrange(8)))
+                expected = re.fullmatch(pattern, t) is not None
+                self.assertEqual(dfa.accepts(t), expected, f"{pattern!r} on '{t}'")
+                self.assertEqual(lazy.accepts(t), expected, f"{pattern!r} on '{t}'")
+
+    def test_symbols_outside_the_alphabet_reject(self):
+        a_star = compile_regex('a*', alphabet='a')
+        self.assertFalse(a_star.accepts('ab'))
+        self.assertFalse(a_star.accepts(b'ab'))
+        self.assertTrue(a_star.accepts('a' * 5000))
+        for tail in ('b', '\u0394'):
+            long = 'a' * 5000 + tail
+            self.assertFalse(a_star.accepts(long))
+            self.assertFalse(a_star.stream().feed(long[:100]).feed(long[100:]).result())
+            self.assertEqual(list(a_star.find_matches('aa' + tail + 'a')), [0, 1, 2])
+        self.assertFalse(a_star.accepts_parallel(b'a' * 5000 + b'b', workers=1, chunk_size=1000))
+        self.assertFalse((~compile_regex('b', alphabet='ab')).accepts('abc'))
+        self.assertFalse((a_star | compile_regex('b', alphabet='b')).accepts('ab'))
+        self.assertFalse((a_star & compile_regex('a*b?', alphabet='ab')).accepts('ac'))
+
+        contains_b = compile_regex('.*b.*', alphabet='ab')
+        for data in ('aab', 'aabx', 'axb', 'a' * 300 + 'x' + 'b', 'a' * 300 + 'b' + 'x' * 300):
+            expected = next((i for i in range(len(data) + 1) if contains_b.accepts(data[:i])), None)
+            self.assertEqual(contains_b.first_match(data), expected, data[-10:])
+            self.assertEqual(contains_b.accepts(data), 'x' not in data, data[-10:])
+
+    def test_long_patterns(self):
+        literal = compile_regex('ab' * 3000)
+        self.assertTrue(literal.accepts('ab' * 3000))
+        self.assertFalse(literal.accepts('ab' * 2999))
+        self.assertEqual(len(literal.states), 6001)
+        words = [format(i, 'b').replace('0', 'a').replace('1', 'b') for i in range(1000, 3000)]
+        alternation = compile_regex('|'.join(words))
+        self.assertTrue(all(alternation.accepts(word) for word in words[::97]))
+        self.assertFalse(alternation.accepts('ab'))
+
+    def test_regex_errors(self):
+        for pattern in ['(a', 'a)', '*a', '[ab', 'a|+', '[b-a]', 'a\\']:
+            with self.assertRaises(ValueError, msg=pattern):
+                compile_regex(pattern)
+        self.assertFalse(compile_regex('x\\*').accepts('xx'))
+        self.assertTrue(compile_regex('x\\*').accepts('x*'))
+
+    def test_invalid_definition(self):
+        with self.assertRaises(ValueError):
+            DFA({'a'}, {'0'}, {'a': {'0': 'b'}}, 'a', {'a'})
+        with self.assertRaises(ValueError):
+            DFA({'a'}, {'0'}, {'a': {'1': 'a'}}, 'a', {'a'})
+        with self.assertRaises(ValueError):
+            DFA({'a'}, {'01'}, {}, 'a', {'a'})
+
+
+if __name__ == '__main__':
+    unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -1,366 +1,872 @@
 # gnf_converter.py
+import collections
+import hashlib
+import io
 import itertools
+import mmap
+import os
+import pickle
 import re
+import tempfile
+import time
+
+EPSILON_WORDS = ("epsilon", "eps", "ε")
+
+
+class GrammarError(ValueError):
+    pass
+
+
+class GrammarSyntaxError(GrammarError):
+    # A malformed rule; line and column are 1-based, text is the offending line.
+    def __init__(self, message, line, column, text):
+        self.line, self.column, self.text = line, column, text
+        super().__init__(f"{message} (line {line}, column {column})")
+
+
+class GrammarLimitError(GrammarError):
+    # A stage stopped because its output would exceed the configured size limit.
+    def __init__(self, stage, limit, size, detail=""):
+        self.stage, self.limit, self.size = stage, limit, size
+        message = f"{stage} exceeded the limit of {limit} productions ({size} so far)"
+        super().__init__(f"{message}: {detail}" if detail else message + ".")
+
+
+class Grammar:
+    # Context-free grammar with interned symbols: every terminal and nonterminal name is an int
+    # index into `names`, and a production is a tuple of those ints (the empty tuple is epsilon).
+    # productions[A] is an insertion-ordered set of right-hand sides (a dict with None values),
+    # so stages dedupe by hashing small int tuples and keep a deterministic order. Text is only
+    # rebuilt by to_dict() at output time. Production sets may be shared between nonterminals
+    # (unit elimination does this), so stages replace a nonterminal's set instead of editing it.
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.nonterminals = set()
+        self.productions = {}
+        self.start = None
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol
+
+    def nonterminal(self, name):
+        symbol = self.intern(name)
+        self.nonterminals.add(symbol)
+        return symbol
+
+    def fresh_nonterminal(self, base, suffixes):
+        # First unused name among base + suffix for suffix in suffixes (an endless iterable).
+        for suffix in suffixes:
+            name = base + suffix
+            if name not in self.ids:
+                return self.nonterminal(name)
+
+    def add(self, lhs, rhs):
+        self.productions.setdefault(lhs, {})[rhs] = None
+
+    def copy(self):
+        # Same symbol table (copied, so new symbols do not leak back) and fresh production sets;
+        # the productions themselves are immutable tuples and are shared.
+        other = self.empty_copy()
+        other.productions = {lhs: dict(rhss) for lhs, rhss in self.productions.items()}
+        return other
+
+    def empty_copy(self):
+        other = Grammar.__new__(Grammar)
+        other.names = list(self.names)
+        other.ids = dict(self.ids)
+        other.nonterminals = set(self.nonterminals)
+        other.productions = {}
+        other.start = self.start
+        return other
+
+    def fingerprint(self):
+        # SHA-256 of the grammar's content by name: start symbol, the nonterminals it uses and the
+        # rules, all sorted, so it does not depend on interning or insertion order.
+        names, nonterminals = self.names, self.nonterminals
+        defined = [lhs for lhs, rhss in self.productions.items() if rhss]
+        used = set(defined)
+        rules = []
+        for lhs in defined:
+            for rhs in self.productions[lhs]:
+                used.update(symbol for symbol in rhs if symbol in nonterminals)
+                rules.append((names[lhs], [names[symbol] for symbol in rhs]))
+        rules.sort()
+        digest = hashlib.sha256()
+        digest.update(repr((names[self.start] if self.start is not None else None,
+                            sorted(names[symbol] for symbol in used))).encode())
+        for rule in rules:
+            digest.update(repr(rule).encode())
+        return digest.hexdigest()
+
+    def production_count(self):
+        return sum(len(rhss) for rhss in self.productions.values())
+
+    def size(self):
+        # |G|: every symbol of every production, plus one for its left-hand side.
+        return sum(len(rhs) + 1 for rhss in self.productions.values() for rhs in rhss)
+
+    def active_nonterminals(self):
+        return sorted(self.names[lhs] for lhs, rhss in self.productions.items() if rhss)
+
+    def terminals(self):
+        used = {symbol for rhss in self.productions.values() for rhs in rhss for symbol in rhs}
+        return sorted(self.names[symbol] for symbol in used if symbol not in self.nonterminals)
+
+    def rhs_text(self, rhs):
+        return [self.names[symbol] for symbol in rhs] if rhs else ['!epsilon']
+
+    def to_dict(self, sort=True):
+        # The dict-of-lists form used by the functions below: {name: [[symbol, ...], ...]}, with
+        # ['!epsilon'] for the empty production and lists sorted with key=str.
+        result = {}
+        for lhs, rhss in self.productions.items():
+            if rhss:
+                productions = [self.rhs_text(rhs) for rhs in rhss]
+                result[self.names[lhs]] = sorted(productions, key=str) if sort else productions
+        return result
+
+    @classmethod
+    def from_dict(cls, grammar, non_terminals=(), start_symbol=None, original_non_terminals=()):
+        # Symbols are nonterminals when they are listed, have productions, or were nonterminals
+        # in the original grammar; everything else on a right-hand side is a terminal.
+        self = cls()
+        for name in itertools.chain(grammar, non_terminals, sorted(original_non_terminals, key=str)):
+            self.nonterminal(name)
+        for lhs, productions in grammar.items():
+            lhs_id = self.ids[lhs]
+            rhss = self.productions.setdefault(lhs_id, {})
+            for production in productions:
+                if production == ['!epsilon']:
+                    rhss[()] = None
+                elif production:
+                    rhss[tuple(map(self.intern, production))] = None
+        if start_symbol is not None:
+            self.start = self.nonterminal(start_symbol)
+        return self
+
+    @classmethod
+    def parse(cls, text):
+        # "A -> x y | z | epsilon" rules, one per line; the first left-hand side is the start
+        # symbol. Raises GrammarError for malformed input (GrammarSyntaxError for a bad line).
+        return cls.parse_lines(io.StringIO(text))
+
+    @classmethod
+    def read(cls, source, encoding='utf-8'):
+        # Like parse, for a path, an open file (text or binary) or a bytes-like buffer such as an
+        # mmap.mmap. The input is read and decoded one line at a time, never held whole.
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding=encoding, newline='') as f:
+                return cls.parse_lines(f)
+        if isinstance(source, memoryview):
+            # The underlying buffer is scanned in place only when the view covers all of it.
+            whole = (isinstance(source.obj, (bytes, bytearray, mmap.mmap)) and source.c_contiguous
+                     and source.nbytes == len(source.obj))
+            source = source.obj if whole else source.tobytes()
+        if isinstance(source, (bytes, bytearray, mmap.mmap)):
+            return cls.parse_lines(line.decode(encoding) for line in _buffer_lines(source))
+        if isinstance(source, io.TextIOBase):
+            return cls.parse_lines(source)
+        text = io.TextIOWrapper(source, encoding=encoding, newline='')
+        try:
+            return cls.parse_lines(text)
+        finally:
+            text.detach()  # leave the caller's file open
+
+    @classmethod
+    def parse_lines(cls, lines):
+        # Single pass over an iterable of lines: each rule is split and its symbols interned as it
+        # is read. A new symbol gets id len(ids) through ids.setdefault, so ids keeps insertion
+        # order and names is just list(ids) at the end; map() over the symbols and a lazy len(ids)
+        # interns a whole alternative without a Python-level call per symbol.
+        self = cls()
+        ids, nonterminals, productions = {}, self.nonterminals, self.productions
+        intern, sizes = ids.setdefault, map(len, itertools.repeat(ids))
+        for number, raw in enumerate(lines, 1):
+            lhs, arrow, rhs_text = raw.partition('->')
+            if not arrow:
+                if raw.strip() and raw.strip() != '\ufeff':
+                    raise GrammarSyntaxError(f"Line '{raw.strip()}' does not contain '->'.",
+                                             number, len(raw.rstrip('\r\n')) + 1, raw)
+                continue
+            lhs = lhs.strip()
+            if number == 1:
+                lhs = lhs.lstrip('\ufeff').strip()
+            if not lhs:
+                raise GrammarSyntaxError(f"Empty non-terminal on LHS in line '{raw.strip()}'.",
+                                         number, raw.index('->') + 1, raw)
+            lhs_id = intern(lhs, len(ids))
+            nonterminals.add(lhs_id)
+            if self.start is None:
+                self.start = lhs_id
+            rules = productions.get(lhs_id)
+            for alternative in rhs_text.split('|'):
+                symbols = alternative.split()
+                if not symbols:
+                    continue
+                if rules is None:
+                    rules = productions[lhs_id] = {}
+                if len(symbols) == 1 and symbols[0].lower() in EPSILON_WORDS:
+                    rules[()] = None
+                else:
+                    rules[tuple(map(intern, symbols, sizes))] = None
+        self.ids, self.names = ids, list(ids)
+        if self.start is None:
+            raise GrammarError("Input is empty or contains no rules.")
+        if not productions:
+            raise GrammarError("No valid rules were parsed.")
+        return self
 
-def parse_grammar(input_text):
-    grammar = {}
-    discovered_non_terminals_lhs = set()
-    all_symbols_in_rhs = set()
-    first_lhs = None
-    original_non_terminals = set()
 
-    lines = [line.strip() for line in input_text.strip().split('\n') if line.strip()]
+def _buffer_lines(buffer):
+    start, end = 0, len(buffer)
+    while start < end:
+        stop = buffer.find(b'\n', start)
+        stop = end if stop < 0 else stop + 1
+        yield buffer[start:stop]
+        start = stop
 
-    if not lines:
-        print("Error: Input is empty or contains no rules.")
-        return None, [], [], None, set()
 
-    for line in lines:
-        if '->' not in line:
-            print(f"Error: Line '{line}' does not contain '->'.")
-            return None, [], [], None, set()
-        lhs, _ = line.split('->', 1)
-        lhs = lhs.strip()
-        if first_lhs is None and lhs: first_lhs = lhs
-        if not lhs:
-            print(f"Error: Empty non-terminal on LHS in line '{line}'.")
-            return None, [], [], None, set()
-        discovered_non_terminals_lhs.add(lhs)
-        original_non_terminals.add(lhs)
-        if lhs not in grammar: grammar[lhs] = []
-
-    for line in lines:
-        lhs, rhs_str = line.split('->', 1)
-        lhs = lhs.strip()
-        productions_alternatives = rhs_str.split('|')
-        current_productions_for_lhs = []
-        for alt in productions_alternatives:
-            alt_stripped = alt.strip()
-            if alt_stripped.lower() in ["epsilon", "eps", "ε"]:
-                symbols_in_production = ["!epsilon"]
-            else:
-                symbols_in_production = alt_stripped.split()
-            if not symbols_in_production and alt_stripped.lower() not in ["epsilon", "eps", "ε"]:
-                continue
-            current_productions_for_lhs.append(symbols_in_production)
-            for sym in symbols_in_production:
-                if sym != "!epsilon": all_symbols_in_rhs.add(sym)
-        if current_productions_for_lhs and lhs in grammar:
-            grammar[lhs].extend(current_productions_for_lhs)
-
-    final_non_terminals_set = set(nt for nt in discovered_non_terminals_lhs if nt in grammar and grammar[nt])
-    active_grammar = {nt: grammar[nt] for nt in final_non_terminals_set}
-    final_non_terminals = sorted(list(final_non_terminals_set))
-
-    terminals = set()
-    all_symbols_in_active_rhs = set(sym for nt in active_grammar for prod in active_grammar[nt] for sym in prod if sym != '!epsilon')
-    for sym in all_symbols_in_active_rhs:
-         if sym not in original_non_terminals:
-              terminals.add(sym)
-
-    if not active_grammar and lines:
-        print("Error: No valid rules were parsed.")
+def parse_grammar(input_text):
+    try:
+        grammar = Grammar.parse(input_text)
+    except GrammarError as error:
+        print(f"Error: {error}")
         return None, [], [], None, set()
-
-    return active_grammar, final_non_terminals, sorted(list(terminals)), first_lhs, original_non_terminals
-
-def find_nullable_non_terminals(grammar, non_terminals):
-    nullable = set()
-    non_terminals_set = set(non_terminals)
-    for V in non_terminals:
-        if V in grammar:
-            if any(prod == ['!epsilon'] for prod in grammar[V]): nullable.add(V)
-    changed = True
-    while changed:
-        changed = False
-        for V in non_terminals:
-            if V in nullable: continue
-            if V not in grammar: continue
-            for production in grammar[V]:
-                if production == ['!epsilon']: continue
-                if production:
-                    all_syms_nullable = True
-                    for symbol in production:
-                        is_terminal = symbol not in non_terminals_set
-                        if not is_terminal and symbol not in nullable:
-                            all_syms_nullable = False; break
-                        elif is_terminal and symbol != '!epsilon':
-                             all_syms_nullable = False; break
-                    if all_syms_nullable:
-                        if V not in nullable: nullable.add(V); changed = True
-                        break
-    return nullable
-
-def eliminate_epsilon_productions(grammar, non_terminals, start_symbol, original_non_terminals_set):
-    nullable_set = find_nullable_non_terminals(grammar, non_terminals)
-    start_symbol_was_nullable = start_symbol in nullable_set
-    new_grammar = {}
-
-    for V in non_terminals:
-        if V not in grammar: continue
-        new_productions_for_V_set = set()
-        for production in grammar[V]:
-            nullable_indices = [i for i, symbol in enumerate(production) if symbol in nullable_set]
-            num_nullable = len(nullable_indices)
-            for i in range(1 << num_nullable):
-                indices_to_remove = set(nullable_indices[j] for j in range(num_nullable) if (i >> j) & 1)
-                new_prod_list = [symbol for idx, symbol in enumerate(production) if idx not in indices_to_remove]
-                if new_prod_list:
-                    new_productions_for_V_set.add(tuple(new_prod_list))
-        
-        filtered_prods = {prod for prod in new_productions_for_V_set if prod != ('!epsilon',)}
-        if filtered_prods:
-             new_grammar[V] = sorted([list(p) for p in filtered_prods], key=str)
-
-    if start_symbol_was_nullable:
-        if start_symbol not in new_grammar: new_grammar[start_symbol] = []
-        if ['!epsilon'] not in new_grammar[start_symbol]:
-            new_grammar[start_symbol].append(['!epsilon'])
-            new_grammar[start_symbol].sort(key=str)
-
-    current_grammar = new_grammar
-    current_non_terminals = sorted([nt for nt in non_terminals if nt in current_grammar and current_grammar[nt]])
-
-    while True:
-        active_nts_in_pass = set(current_non_terminals)
-        grammar_after_cleanup = {}
-        changed_in_pass = False
-
-        for nt, prods in current_grammar.items():
-            valid_prods_for_nt = []
-            for prod in prods:
-                is_valid_prod = True
-                if prod == ['!epsilon']: is_valid_prod = True
-                else:
-                    for symbol in prod:
-                        is_potential_terminal = symbol not in original_non_terminals_set
-                        is_active_non_terminal = symbol in active_nts_in_pass
-                        if not is_potential_terminal and not is_active_non_terminal:
-                            is_valid_prod = False; break
-                if is_valid_prod: valid_prods_for_nt.append(prod)
-
-            if valid_prods_for_nt:
-                original_prods_before_cleanup = current_grammar.get(nt, [])
-                if len(valid_prods_for_nt) < len(original_prods_before_cleanup):
-                    changed_in_pass = True
-                grammar_after_cleanup[nt] = sorted(valid_prods_for_nt, key=str)
-            elif nt in current_grammar:
-                 changed_in_pass = True
-
-        current_grammar = grammar_after_cleanup
-        current_non_terminals = sorted(current_grammar.keys())
-        if not changed_in_pass: break
-
-    return current_grammar, current_non_terminals
-
-def eliminate_unit_productions(grammar, non_terminals):
+    names = grammar.names
+    return (grammar.to_dict(sort=False), grammar.active_nonterminals(), grammar.terminals(),
+            names[grammar.start], {names[symbol] for symbol in grammar.nonterminals})
+
+
+def _occurrence_index(grammar):
+    # Flattens the productions into (lhs, rhs) rules and maps every symbol to the rules it occurs
+    # in, once per occurrence. The fixpoints below visit each occurrence at most once, so they
+    # run in O(|G|) instead of rescanning the grammar until nothing changes.
+    rules = [(lhs, rhs) for lhs, rhss in grammar.productions.items() for rhs in rhss]
+    occurrences = {}
+    for index, (_, rhs) in enumerate(rules):
+        for symbol in rhs:
+            occurrences.setdefault(symbol, []).append(index)
+    return rules, occurrences
+
+
+def _propagate(rules, occurrences, pending):
+    # pending[i] counts the symbols of rule i not yet known to have the property. A rule whose
+    # count drops to zero gives its left-hand side the property, which then counts down every
+    # rule that left-hand side occurs in.
+    found = set()
+    worklist = [rules[index][0] for index, count in enumerate(pending) if count == 0]
+    while worklist:
+        symbol = worklist.pop()
+        if symbol in found:
+            continue
+        found.add(symbol)
+        for index in occurrences.get(symbol, ()):
+            pending[index] -= 1
+            if pending[index] == 0:
+                worklist.append(rules[index][0])
+    return found
+
+
+def _nullable(grammar, index=None):
+    rules, occurrences = index or _occurrence_index(grammar)
+    return _propagate(rules, occurrences, [len(rhs) for _, rhs in rules])
+
+
+def _generating(grammar, index=None):
+    rules, occurrences = index or _occurrence_index(grammar)
+    nonterminals = grammar.nonterminals
+    return _propagate(rules, occurrences, [sum(symbol in nonterminals for symbol in rhs) for _, rhs in rules])
+
+
+def _reachable(grammar, start):
+    productions, nonterminals = grammar.productions, grammar.nonterminals
+    reached, stack = {start}, [start]
+    while stack:
+        for rhs in productions.get(stack.pop(), ()):
+            for symbol in rhs:
+                if symbol in nonterminals and symbol not in reached:
+                    reached.add(symbol)
+                    stack.append(symbol)
+    return reached
+
+
+def find_nullable_non_terminals(grammar, non_terminals=None):
+    if isinstance(grammar, Grammar):
+        return _nullable(grammar)
+    legacy = Grammar.from_dict({nt: grammar[nt] for nt in non_terminals if nt in grammar}, non_terminals)
+    return {legacy.names[symbol] for symbol in _nullable(legacy)}
+
+
+def find_generating_non_terminals(grammar, non_terminals=None):
+    # Nonterminals that derive at least one string of terminals.
+    if isinstance(grammar, Grammar):
+        return _generating(grammar)
+    legacy = Grammar.from_dict({nt: grammar[nt] for nt in non_terminals if nt in grammar}, non_terminals)
+    return {legacy.names[symbol] for symbol in _generating(legacy)}
+
+
+def find_reachable_non_terminals(grammar, non_terminals=None, start_symbol=None):
+    # Nonterminals that occur in some sentential form derived from the start symbol.
+    if isinstance(grammar, Grammar):
+        return _reachable(grammar, grammar.start if start_symbol is None else grammar.ids[start_symbol])
+    legacy = Grammar.from_dict({nt: grammar[nt] for nt in non_terminals if nt in grammar}, non_terminals, start_symbol)
+    return {legacy.names[symbol] for symbol in _reachable(legacy, legacy.start)}
+
+
+def _binarize(grammar, nullable):
+    # Splits right-hand sides with two or more nullable symbols into a chain of two-symbol rules,
+    # A -> X1 X2 ... Xk  becomes  A -> X1 H1, H1 -> X2 H2, ..., with one helper per distinct
+    # suffix. Dropping nullable symbols then yields at most four alternatives per rule instead
+    # of 2^k.
+    result = grammar.copy()
+    helpers = {}
+    for lhs, rhss in grammar.productions.items():
+        if all(len(rhs) <= 2 or sum(symbol in nullable for symbol in rhs) < 2 for rhs in rhss):
+            continue
+        split = {}
+        for rhs in rhss:
+            if len(rhs) > 2 and sum(symbol in nullable for symbol in rhs) >= 2:
+                rhs = (rhs[0], _suffix_helper(result, helpers, rhs[1:], grammar.names[lhs]))
+            split[rhs] = None
+        result.productions[lhs] = split
+    return result
+
+
+def _suffix_helper(grammar, helpers, suffix, owner):
+    if len(suffix) == 1:
+        return suffix[0]
+    helper = helpers.get(suffix)
+    if helper is None:
+        rest = _suffix_helper(grammar, helpers, suffix[1:], owner)
+        helper = helpers[suffix] = grammar.fresh_nonterminal(owner + "_", map(str, itertools.count(1)))
+        grammar.add(helper, (suffix[0], rest))
+    return helper
+
+
+def _eliminate_epsilon(grammar, binarize=False, max_productions=None):
+    nullable = _nullable(grammar)
+    if binarize:
+        grammar = _binarize(grammar, nullable)
+        nullable = _nullable(grammar)
+    result = grammar.empty_copy()
+    total = 0
+    for lhs, rhss in grammar.productions.items():
+        expanded = {}
+        for rhs in rhss:
+            # Extends every kept prefix by one symbol at a time, so duplicates collapse early
+            # and the limit is checked before the next doubling.
+            prefixes = {(): None}
+            for symbol in rhs:
+                extended = {prefix + (symbol,): None for prefix in prefixes}
+                if symbol in nullable:
+                    extended.update(prefixes)
+                prefixes = extended
+                if max_productions is not None and total + len(expanded) + len(prefixes) > max_productions:
+                    raise GrammarLimitError("Epsilon elimination", max_productions, total + len(expanded),
+                                            f"expanding {grammar.names[lhs]} -> {' '.join(grammar.rhs_text(rhs))}")
+            expanded.update(prefixes)
+        expanded.pop((), None)
+        if expanded:
+            result.productions[lhs] = expanded
+            total += len(expanded)
+    if grammar.start in nullable:
+        result.add(grammar.start, ())
+    _drop_undefined(result)
+    return result
+
+
+def _drop_undefined(grammar):
+    # Removes productions that use a nonterminal without productions; a nonterminal that loses
+    # its last production this way is undefined in turn.
+    productions = grammar.productions
+    rules, occurrences = _occurrence_index(grammar)
+    remaining = {lhs: len(rhss) for lhs, rhss in productions.items()}
+    worklist = [nt for nt in grammar.nonterminals if not remaining.get(nt)]
+    dropped = set()
+    while worklist:
+        for index in occurrences.get(worklist.pop(), ()):
+            if index in dropped:
+                continue
+            dropped.add(index)
+            lhs, rhs = rules[index]
+            del productions[lhs][rhs]
+            remaining[lhs] -= 1
+            if not remaining[lhs]:
+                del productions[lhs]
+                worklist.append(lhs)
+    for lhs in [lhs for lhs, rhss in productions.items() if not rhss]:
+        del productions[lhs]
+
+
+def eliminate_epsilon_productions(grammar, non_terminals=None, start_symbol=None, original_non_terminals_set=(),
+                                  binarize=False, max_productions=None):
+    # binarize=True splits long rules first so the result grows linearly; max_productions makes the
+    # stage raise GrammarLimitError as soon as the result would have more productions than that.
+    if isinstance(grammar, Grammar):
+        return _eliminate_epsilon(grammar, binarize, max_productions)
+    legacy = Grammar.from_dict({nt: grammar[nt] for nt in non_terminals if nt in grammar},
+                               non_terminals, start_symbol, original_non_terminals_set)
+    result = _eliminate_epsilon(legacy, binarize, max_productions)
+    return result.to_dict(), result.active_nonterminals()
+
+
+def _strongly_connected(nodes, edges):
+    # Tarjan's algorithm without recursion. Yields every strongly connected component after all
+    # components reachable from it (reverse topological order).
+    index, low, on_stack, stack = {}, {}, set(), []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges.get(root, ())))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(edges.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    yield component
+
+
+def _eliminate_units(grammar):
+    # Nonterminals on a cycle of unit productions derive each other, so they end up with the same
+    # productions: the unit graph is collapsed into strongly connected components, and each
+    # component's non-unit productions plus those of the components it reaches are collected once,
+    # in one pass in topological order, into a set shared by all of its members.
+    productions, nonterminals = grammar.productions, grammar.nonterminals
+    units, own = {}, {}
+    for lhs, rhss in productions.items():
+        units[lhs] = [rhs[0] for rhs in rhss if len(rhs) == 1 and rhs[0] in nonterminals]
+        own[lhs] = [rhs for rhs in rhss if not (len(rhs) == 1 and rhs[0] in nonterminals)]
+    result = grammar.empty_copy()
+    closure = {}
+    for component in _strongly_connected(list(productions), units):
+        collected = {}
+        for member in component:
+            collected.update(dict.fromkeys(own.get(member, ())))
+        merged = {id(collected)}
+        for member in component:
+            for target in units.get(member, ()):
+                reached = closure.get(target)
+                if reached is not None and id(reached) not in merged:
+                    merged.add(id(reached))
+                    collected.update(reached)
+        for member in component:
+            closure[member] = collected
+            if collected and member in productions:
+                result.productions[member] = collected
+    return result
+
+
+def eliminate_unit_productions(grammar, non_terminals=None):
+    if isinstance(grammar, Grammar):
+        return _eliminate_units(grammar)
     if not grammar: return {}, []
-    grammar_copy = {k: [p[:] for p in v] for k, v in grammar.items()}
-    non_terminals_set = set(non_terminals)
-
-    unit_pairs = set((V, V) for V in non_terminals)
-    changed = True
-    while changed:
-        changed = False
-        new_pairs_this_iter = set()
-        for A in non_terminals:
-            if A not in grammar_copy: continue
-            for production in grammar_copy[A]:
-                if len(production) == 1 and production[0] in non_terminals_set:
-                    B = production[0]
-                    if (A, B) not in unit_pairs: new_pairs_this_iter.add((A, B)); changed = True
-        unit_pairs.update(new_pairs_this_iter)
-        
-        new_pairs_transitive = set()
-        for A, B in list(unit_pairs):
-            for B_prime, C in list(unit_pairs):
-                if B == B_prime and (A, C) not in unit_pairs:
-                    new_pairs_transitive.add((A, C)); changed = True
-        unit_pairs.update(new_pairs_transitive)
-
-    new_grammar = {}
-    processed_productions = set()
-    for A, B in unit_pairs:
-        if B not in grammar_copy: continue
-        for production in grammar_copy[B]:
-            is_unit = len(production) == 1 and production[0] in non_terminals_set
-            if not is_unit:
-                prod_tuple = tuple(production)
-                prod_key = (A, prod_tuple)
-                if prod_key not in processed_productions:
-                    if A not in new_grammar: new_grammar[A] = []
-                    if production not in new_grammar.get(A, []): new_grammar[A].append(production)
-                    processed_productions.add(prod_key)
-
-    for V in new_grammar: new_grammar[V] = sorted(new_grammar[V], key=str)
-    final_non_terminals = sorted([nt for nt in non_terminals if nt in new_grammar and new_grammar[nt]])
-    final_grammar = {nt: new_grammar[nt] for nt in final_non_terminals}
-    return final_grammar, final_non_terminals
-
-def eliminate_direct_left_recursion(grammar, non_terminal, all_non_terminals):
-    if non_terminal not in grammar: return None
-    
-    productions = grammar[non_terminal]
-    left_recursive_rules_alpha = []
-    non_left_recursive_rules_beta = []
-
-    for prod in productions:
-        if prod and prod[0] == non_terminal:
-            alpha = prod[1:]
-            if not alpha: continue 
-            left_recursive_rules_alpha.append(alpha)
-        else:
-            non_left_recursive_rules_beta.append(prod)
+    legacy = Grammar.from_dict({nt: grammar[nt] for nt in non_terminals if nt in grammar}, non_terminals)
+    result = _eliminate_units(legacy)
+    return result.to_dict(), result.active_nonterminals()
 
-    if not left_recursive_rules_alpha: return None
-    if not non_left_recursive_rules_beta:
-        if non_terminal in grammar: del grammar[non_terminal]
+
+def _eliminate_direct_left_recursion(grammar, lhs):
+    rhss = grammar.productions.get(lhs)
+    if not rhss:
+        return None
+    alphas = [rhs[1:] for rhs in rhss if rhs and rhs[0] == lhs and len(rhs) > 1]
+    betas = [rhs for rhs in rhss if not rhs or rhs[0] != lhs]
+    if not alphas:
         return None
+    if not betas:
+        del grammar.productions[lhs]
+        return None
+    tail = grammar.fresh_nonterminal(grammar.names[lhs], ("'" * n for n in itertools.count(1)))
+    grammar.productions[lhs] = {rhs: None for beta in betas for rhs in (beta, beta + (tail,))}
+    grammar.productions[tail] = {rhs: None for alpha in alphas for rhs in (alpha, alpha + (tail,))}
+    return grammar.names[tail]
+
 
-    new_nt_name = non_terminal + "'"
-    while new_nt_name in all_non_terminals or new_nt_name in grammar: new_nt_name += "'"
-
-    new_A_productions = []
-    new_A_prime_productions = []
-    for beta in non_left_recursive_rules_beta:
-        new_A_productions.append(beta)
-        if beta != ['!epsilon']: new_A_productions.append(beta + [new_nt_name])
-        else: new_A_productions.append([new_nt_name])
-    for alpha in left_recursive_rules_alpha:
-        new_A_prime_productions.append(alpha)
-        new_A_prime_productions.append(alpha + [new_nt_name])
-
-    grammar[non_terminal] = sorted(new_A_productions, key=str)
-    grammar[new_nt_name] = sorted(new_A_prime_productions, key=str)
+def eliminate_direct_left_recursion(grammar, non_terminal, all_non_terminals=()):
+    if isinstance(grammar, Grammar):
+        return _eliminate_direct_left_recursion(grammar, grammar.ids.get(non_terminal))
+    if non_terminal not in grammar: return None
+    converted = Grammar.from_dict(grammar, all_non_terminals)
+    new_nt_name = _eliminate_direct_left_recursion(converted, converted.ids[non_terminal])
+    if new_nt_name is None and converted.productions.get(converted.ids[non_terminal]): return None
+    for name in (non_terminal, new_nt_name):
+        if name is None: continue
+        rhss = converted.productions.get(converted.ids[name])
+        if rhss: grammar[name] = sorted(map(converted.rhs_text, rhss), key=str)
+        else: grammar.pop(name, None)
     return new_nt_name
 
-def substitute_to_start_terminals(grammar, non_terminals):
-    if not grammar: return
-    non_terminals_set = set(non_terminals)
 
-    made_change_global = True
+def _substitute_first_symbols(grammar, nonterminal_count):
+    productions = grammar.productions
+    nonterminals = grammar.nonterminals
+    names = grammar.names
+    max_iterations = nonterminal_count * nonterminal_count + nonterminal_count + 5
     iteration_count = 0
-    max_iterations = len(non_terminals) * len(non_terminals) + len(non_terminals) + 5 
-
-    while made_change_global and iteration_count < max_iterations:
-        made_change_global = False
+    made_change = True
+    while made_change and iteration_count < max_iterations:
+        made_change = False
         iteration_count += 1
-        
-        keys_to_process = list(grammar.keys())
-
-        for A in keys_to_process:
-            if A not in grammar: continue
-            
-            current_productions_for_A = grammar[A]
-            next_productions_for_A = []
-            modified_this_A = False
-
-            for production in current_productions_for_A:
-                if not production or production == ['!epsilon']:
-                    next_productions_for_A.append(production)
-                    continue
-                
-                first_symbol = production[0]
-                
-                if first_symbol in non_terminals_set and first_symbol in grammar:
-                    B = first_symbol
-                    gamma = production[1:]
-                    modified_this_A = True
-                    made_change_global = True
-
-                    for b_production in grammar[B]:
-                        if b_production and b_production[0] == A and not gamma:
-                            next_productions_for_A.append(production) 
+        for lhs in sorted(productions, key=names.__getitem__):
+            if lhs not in productions:
+                continue
+            expanded = {}
+            modified = False
+            for rhs in productions[lhs]:
+                first = rhs[0] if rhs else None
+                if first in nonterminals and first in productions:
+                    modified = made_change = True
+                    gamma = rhs[1:]
+                    for first_rhs in productions[first]:
+                        if first_rhs and first_rhs[0] == lhs and not gamma:
+                            expanded[rhs] = None
                             continue
-                        new_prod = b_production + gamma
-                        next_productions_for_A.append(new_prod)
+                        new_rhs = first_rhs + gamma
+                        if new_rhs:
+                            expanded[new_rhs] = None
                 else:
-                    next_productions_for_A.append(production)
-            
-            if modified_this_A:
-                unique_prods = {tuple(p) for p in next_productions_for_A if p}
-                final_prods = []
-                has_epsilon = False
-                for p_tuple in unique_prods:
-                    p_list = list(p_tuple)
-                    if p_list == ['!epsilon']: has_epsilon = True
-                    else: final_prods.append(p_list)
-                if has_epsilon: final_prods.append(['!epsilon'])
-                
-                if final_prods:
-                    grammar[A] = sorted(final_prods, key=str)
-                elif A in grammar: # Became empty
-                     del grammar[A]
-
-
+                    expanded[rhs] = None
+            if modified:
+                if expanded:
+                    productions[lhs] = expanded
+                else:
+                    del productions[lhs]
     if iteration_count >= max_iterations:
-         print(f"Warning: Substitution loop reached max iterations ({max_iterations}).")
+        print(f"Warning: Substitution loop reached max iterations ({max_iterations}).")
 
-def finalize_gnf_rhs(grammar, non_terminals, original_non_terminals_set):
-    if not grammar: return {}, []
 
-    final_grammar = {}
-    new_nt_map = {} 
-    all_new_nt_names_generated = set()
-    current_non_terminals_set = set(non_terminals) 
-
-    grammar_keys = list(grammar.keys()) 
-
-    for V in grammar_keys:
-        if V not in grammar: continue
-        final_prods_for_V = []
-        for production in grammar[V]:
-            if not production: continue
-            if production == ['!epsilon']: 
-                final_prods_for_V.append(production); continue
-
-            first_symbol = production[0]
-            is_terminal_start = first_symbol not in original_non_terminals_set and first_symbol != '!epsilon'
-            if not is_terminal_start:
-                # print(f"Error: Rule '{V} -> {' '.join(production)}' doesn't start with terminal before final step!")
-                final_prods_for_V.append(production)
+def substitute_to_start_terminals(grammar, non_terminals=None):
+    if isinstance(grammar, Grammar):
+        return _substitute_first_symbols(grammar, len(grammar.active_nonterminals()))
+    if not grammar: return
+    converted = Grammar.from_dict(grammar, non_terminals)
+    _substitute_first_symbols(converted, len(non_terminals))
+    grammar.clear()
+    grammar.update(converted.to_dict())
+
+
+def _finalize(grammar):
+    # Replaces every terminal after the first symbol with a nonterminal X_<TERMINAL> -> terminal.
+    result = grammar.empty_copy()
+    nonterminals = grammar.nonterminals
+    helpers = {}
+    for lhs in sorted(grammar.productions, key=grammar.names.__getitem__):
+        finished = {}
+        for rhs in sorted(grammar.productions[lhs], key=lambda rhs: str(grammar.rhs_text(rhs))):
+            if not rhs or rhs[0] in nonterminals:
+                finished[rhs] = None
                 continue
+            new_rhs = [rhs[0]]
+            for symbol in rhs[1:]:
+                if symbol not in nonterminals:
+                    helper = helpers.get(symbol)
+                    if helper is None:
+                        base = "X_" + re.sub(r'\W|^(?=\d)', '_', grammar.names[symbol]).upper()
+                        helper = helpers[symbol] = result.fresh_nonterminal(
+                            base, itertools.chain([''], map(str, itertools.count(1))))
+                    symbol = helper
+                new_rhs.append(symbol)
+            finished[tuple(new_rhs)] = None
+        if finished:
+            result.productions[lhs] = finished
+    for terminal, helper in helpers.items():
+        result.add(helper, (terminal,))
+    return result
+
+
+def finalize_gnf_rhs(grammar, non_terminals=None, original_non_terminals_set=()):
+    if isinstance(grammar, Grammar):
+        return _finalize(grammar)
+    if not grammar: return {}, []
+    legacy = Grammar.from_dict(grammar, non_terminals, None, original_non_terminals_set)
+    result = _finalize(legacy)
+    return result.to_dict(), result.active_nonterminals()
+
+
+class GNFStats:
+    # How convert_to_gnf grew the grammar:
+    #   input_productions, input_symbols    - size of the grammar it was given (symbols as in Grammar.size)
+    #   output_productions, output_symbols  - size of the GNF result
+    #   stages                              - [(stage, productions after it)] in order
+    #   peak_productions                    - most productions held at once, including partial stages
+    #   nonterminals_added                  - new nonterminals in the result (A/B, helpers, X_ rules)
+    #   cached_stages                       - stages whose output came from a GNFPipeline cache
+    #   wall_time                           - seconds
+    def __init__(self, grammar):
+        self.input_productions = grammar.production_count()
+        self.input_symbols = grammar.size()
+        self.output_productions = self.output_symbols = 0
+        self.stages = []
+        self.peak_productions = self.input_productions
+        self.nonterminals_added = 0
+        self.cached_stages = []
+        self.wall_time = 0.0
+
+    def stage(self, name, grammar, cached=False):
+        count = grammar.production_count()
+        self.stages.append((name, count))
+        self.peak_productions = max(self.peak_productions, count)
+        if cached:
+            self.cached_stages.append(name)
+
+    @property
+    def blowup(self):
+        return self.output_symbols / self.input_symbols if self.input_symbols else 0.0
+
+    def as_dict(self):
+        return {
+            'input_productions': self.input_productions,
+            'input_symbols': self.input_symbols,
+            'output_productions': self.output_productions,
+            'output_symbols': self.output_symbols,
+            'blowup': self.blowup,
+            'stages': [{'stage': name, 'productions': count} for name, count in self.stages],
+            'peak_productions': self.peak_productions,
+            'nonterminals_added': self.nonterminals_added,
+            'cached_stages': list(self.cached_stages),
+            'wall_time': self.wall_time,
+        }
+
+
+def _remove_useless(grammar):
+    # Keeps the nonterminals that are generating and reachable from the start symbol.
+    generating = _generating(grammar)
+    nonterminals = grammar.nonterminals
+    result = grammar.empty_copy()
+    for lhs, rhss in grammar.productions.items():
+        if lhs in generating:
+            kept = {rhs: None for rhs in rhss if all(s in generating or s not in nonterminals for s in rhs)}
+            if kept:
+                result.productions[lhs] = kept
+    reachable = _reachable(result, result.start)
+    result.productions = {lhs: rhss for lhs, rhss in result.productions.items() if lhs in reachable}
+    return result
+
+
+def _left_corner_gnf(grammar, max_productions, stats):
+    # Rosenkrantz's construction for an epsilon-free, unit-free grammar. Split the rules of each
+    # A_j into K_j (rules starting with a terminal) and H_ij = {alpha : A_j -> A_i alpha}; as
+    # language equations the nonterminals are X = X H + K, whose solution is X = K + K Y with
+    # Y = H + H Y. Y_ij is the new nonterminal "A_j/A_i" (A_j with its left corner A_i already
+    # read), and exists only when A_i is a left corner of A_j. That gives
+    #     A_j -> K_j | K_i A_j/A_i
+    #     A_j/A_i -> alpha | alpha A_j/A_k    for A_k -> A_i alpha
+    # and substituting the (terminal-first) A rules for a leading nonterminal of alpha puts every
+    # rule in GNF. Left recursion, direct or indirect, needs no ordering, and the result has
+    # polynomial size: no more than |K| * n rules per A_j, and |H| * n * |A rules| over all A/B.
+    productions, nonterminals, names = grammar.productions, grammar.nonterminals, grammar.names
+    terminal_first, corners, corner_of = {}, {}, {}
+    for lhs, rhss in productions.items():
+        terminal_first[lhs] = [rhs for rhs in rhss if rhs[0] not in nonterminals]
+        corners[lhs] = row = {}
+        for rhs in rhss:
+            if rhs[0] in nonterminals:
+                row.setdefault(rhs[0], []).append(rhs[1:])
+        for corner in row:
+            corner_of.setdefault(corner, []).append(lhs)
+
+    result = grammar.empty_copy()
+    slash = {}
+    for lhs in productions:
+        reached, stack = {}, [lhs]
+        while stack:
+            for corner in corners.get(stack.pop(), ()):
+                if corner not in reached:
+                    reached[corner] = None
+                    stack.append(corner)
+        slash[lhs] = {corner: result.fresh_nonterminal(f"{names[lhs]}/{names[corner]}", ("'" * n for n in itertools.count()))
+                      for corner in sorted(reached, key=names.__getitem__)}
+
+    total = 0
+
+    def emit(lhs, rules):
+        nonlocal total
+        total += len(rules)
+        stats.peak_productions = max(stats.peak_productions, total)
+        if max_productions is not None and total > max_productions:
+            raise GrammarLimitError("GNF conversion", max_productions, total, f"building {result.names[lhs]}")
+        if rules:
+            result.productions[lhs] = rules
+
+    for lhs in productions:
+        rules = dict.fromkeys(terminal_first[lhs])
+        for corner, tail in slash[lhs].items():
+            for rhs in terminal_first.get(corner, ()):
+                rules[rhs + (tail,)] = None
+        emit(lhs, rules)
+    for lhs, row in slash.items():
+        for corner, tail in row.items():
+            bodies = [alpha for alpha in corners[lhs].get(corner, ())]
+            for parent in corner_of.get(corner, ()):
+                if parent in row:
+                    bodies.extend(alpha + (row[parent],) for alpha in corners[parent][corner])
+            rules = {}
+            for body in bodies:
+                if body[0] in nonterminals:
+                    for first in result.productions.get(body[0], ()):
+                        rules[first + body[1:]] = None
+                else:
+                    rules[body] = None
+            emit(tail, rules)
+    return result
+
+
+def _apart_from_empty_start(grammar, stage, *args):
+    # Only the start symbol keeps an empty production after epsilon elimination, and every other
+    # use of it already has a variant without it, so the later stages run without it (unit
+    # elimination would copy it to A -> S) and it is put back on their result.
+    start_rules = grammar.productions.get(grammar.start, {})
+    if () not in start_rules:
+        return stage(grammar, *args)
+    stripped = grammar.empty_copy()
+    stripped.productions = dict(grammar.productions)
+    stripped.productions[grammar.start] = {rhs: None for rhs in start_rules if rhs}
+    result = stage(stripped, *args)
+    result.productions[result.start] = {**result.productions.get(result.start, {}), (): None}
+    return result
+
+
+def _units_stage(grammar):
+    return _remove_useless(_eliminate_units(grammar))
+
+
+def _left_corner_stage(grammar, max_productions, stats):
+    return _remove_useless(_left_corner_gnf(grammar, max_productions, stats))
+
+
+class GNFPipeline:
+    # The stages of convert_to_gnf as a chain of Grammar -> Grammar functions that never modify
+    # their input, so each result is handed to the next stage as is. Every stage's output is
+    # memoized under (stage, options, fingerprint of its input): in memory, keeping the
+    # cache_size most recently used results, and as pickles in cache_dir when one is given.
+    # Converting a grammar again after editing a rule reruns only the stages whose input changed
+    # (a rule that becomes useless, for instance, stops mattering after the unit stage).
+    STAGES = ("epsilon", "unit", "left corners", "gnf")
+
+    def __init__(self, binarize=False, max_productions=None, cache_size=64, cache_dir=None):
+        self.binarize = binarize
+        self.max_productions = max_productions
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.hits = self.misses = 0
+        self._memory = collections.OrderedDict()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def clear(self):
+        self._memory.clear()
+
+    def run(self, grammar):
+        # Returns (gnf_grammar, GNFStats) like convert_to_gnf; the grammar is the caller's own copy.
+        started = time.perf_counter()
+        stats = GNFStats(grammar)
+        work = grammar
+        caching = self.cache_size > 0 or self.cache_dir is not None
+        key = grammar.fingerprint() if caching else None
+        for name in self.STAGES:
+            stage_key = f"{name}|{self.binarize}|{key}" if caching else None
+            result = self._lookup(stage_key) if caching else None
+            if result is None:
+                result = self._run_stage(name, work, stats)
+                if caching:
+                    self._store(stage_key, result)
+                stats.stage(name, result)
+            else:
+                stats.stage(name, result, cached=True)
+            if self.max_productions is not None and result.production_count() > self.max_productions:
+                raise GrammarLimitError("GNF conversion", self.max_productions, result.production_count(),
+                                        f"after the {name} stage")
+            work = result
+            if caching:
+                key = work.fingerprint()
+        stats.output_productions = work.production_count()
+        stats.output_symbols = work.size()
+        original = {grammar.names[symbol] for symbol in grammar.nonterminals}
+        stats.nonterminals_added = sum(work.names[lhs] not in original for lhs in work.productions)
+        stats.wall_time = time.perf_counter() - started
+        return (work.copy() if caching else work), stats
+
+    def _run_stage(self, name, grammar, stats):
+        if name == "epsilon":
+            return _eliminate_epsilon(grammar, self.binarize, self.max_productions)
+        if name == "unit":
+            return _apart_from_empty_start(grammar, _units_stage)
+        if name == "left corners":
+            return _apart_from_empty_start(grammar, _left_corner_stage, self.max_productions, stats)
+        return _finalize(grammar)
+
+    def _lookup(self, key):
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+        elif self.cache_dir is not None:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                result = None
+            if result is not None:
+                self._remember(key, result)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _store(self, key, result):
+        self._remember(key, result)
+        if self.cache_dir is not None:
+            handle, temporary = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(handle, 'wb') as f:
+                pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self._path(key))
+
+    def _remember(self, key, result):
+        if self.cache_size > 0:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.cache_size:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".pickle")
+
+
+def convert_to_gnf(grammar, binarize=False, max_productions=None):
+    # Full conversion of a Grammar to Greibach Normal Form: epsilon and unit elimination, useless
+    # symbol removal, Rosenkrantz's left-corner construction (_left_corner_gnf), then X_ rules for
+    # terminals after the first symbol. Returns (gnf_grammar, GNFStats). The input is not
+    # modified; if any stage would hold more than max_productions productions, GrammarLimitError
+    # is raised and no partial grammar is returned. GNFPipeline runs the same stages with caching.
+    return GNFPipeline(binarize, max_productions, cache_size=0).run(grammar)
 
-            alpha_part = production[1:]
-            new_alpha_part = []
-            for symbol in alpha_part:
-                is_terminal = symbol not in original_non_terminals_set and symbol != '!epsilon'
-                if is_terminal:
-                    if symbol not in new_nt_map: 
-                        clean_symbol_name = re.sub(r'\W|^(?=\d)', '_', symbol) 
-                        base_name = "X_" + clean_symbol_name.upper()
-                        new_nt_name = base_name
-                        suffix = 1
-                        while new_nt_name in original_non_terminals_set or \
-                              new_nt_name in current_non_terminals_set or \
-                              new_nt_name in all_new_nt_names_generated:
-                            new_nt_name = base_name + str(suffix)
-                            suffix += 1
-                        new_nt_map[symbol] = new_nt_name
-                        all_new_nt_names_generated.add(new_nt_name)
-                    new_alpha_part.append(new_nt_map[symbol])
-                else: 
-                    new_alpha_part.append(symbol)
-
-            final_production = [first_symbol] + new_alpha_part
-            final_prods_for_V.append(final_production)
-
-        if final_prods_for_V:
-            unique_prods = {tuple(p) for p in final_prods_for_V}
-            final_grammar[V] = sorted([list(p) for p in unique_prods], key=str)
-
-    for terminal, new_nt_name in new_nt_map.items():
-        if new_nt_name not in final_grammar:
-             final_grammar[new_nt_name] = []
-        if [terminal] not in final_grammar[new_nt_name]:
-             final_grammar[new_nt_name].append([terminal])
-             final_grammar[new_nt_name].sort(key=str)
-    
-    combined_non_terminals = set(non_terminals) | all_new_nt_names_generated
-    final_active_non_terminals = sorted([nt for nt in combined_non_terminals if nt in final_grammar and final_grammar[nt]])
-    truly_final_grammar = {nt: final_grammar[nt] for nt in final_active_non_terminals}
-
-    return truly_final_grammar, final_active_non_terminals
 
 if __name__ == "__main__":
 
@@ -389,11 +895,17 @@ if __name__ == "__main__":
     B -> S | b
     """
 
+    sample_cfg_text_5_indirect = """
+    S -> A a | b
+    A -> S c | A d | e
+    """
+
     tests = {
         "Example 1": sample_cfg_text_1,
         "Example 2 (Expr)": sample_cfg_text_2,
         "Example 3 (Seq Nullable)": sample_cfg_text_3,
-        "Example 4 (Unit Cycles)": sample_cfg_text_4_units
+        "Example 4 (Unit Cycles)": sample_cfg_text_4_units,
+        "Example 5 (Indirect Left Recursion)": sample_cfg_text_5_indirect
     }
 
     def print_grammar(grammar_dict, title="Grammar"):
@@ -407,69 +919,49 @@ if __name__ == "__main__":
                 prods_str_list.append("eps" if p == ['!epsilon'] else " ".join(p)) # Changed to 'eps'
             if prods_str_list: print(f"  {V} -> " + " | ".join(prods_str_list))
 
+    pipeline = GNFPipeline(max_productions=100000)
     for test_name, cfg_text in tests.items():
         print(f"\n--- Testing {test_name} ---")
-        parsed_grammar, parsed_non_terminals, parsed_terminals, detected_start_symbol, original_non_terminals = parse_grammar(cfg_text)
-
-        if parsed_grammar:
-            start_symbol = detected_start_symbol
-            if not start_symbol:
-                 if parsed_non_terminals: start_symbol = parsed_non_terminals[0]
-                 else: print("Error: Cannot determine start symbol."); continue
-
-            print_grammar(parsed_grammar, title="Original Grammar")
-            print(f"\nStart Symbol: {start_symbol}")
-            print(f"Non-Terminals: {parsed_non_terminals}")
-            print(f"Terminals: {parsed_terminals}")
-            nullable_set = find_nullable_non_terminals(parsed_grammar, parsed_non_terminals)
-            print(f"Nullable Set: {nullable_set if nullable_set else 'None'}")
-
-            current_grammar, current_nt = parsed_grammar, parsed_non_terminals
-
-            grammar_step1, nt_step1 = eliminate_epsilon_productions(current_grammar, current_nt, start_symbol, original_non_terminals)
-            print_grammar(grammar_step1, title="1. After Epsilon Elimination")
-            print(f"Non-Terminals: {nt_step1}")
-            current_grammar, current_nt = grammar_step1, nt_step1
-
-            if current_grammar:
-                grammar_step2, nt_step2 = eliminate_unit_productions(current_grammar, current_nt)
-                print_grammar(grammar_step2, title="2. After Unit Production Elimination")
-                print(f"Non-Terminals: {nt_step2}")
-                current_grammar, current_nt = grammar_step2, nt_step2
-            
-            if current_grammar:
-                grammar_step3 = {k: [p[:] for p in v] for k, v in current_grammar.items()}
-                nt_step3 = list(current_nt)
-                newly_added_nts_step3 = set()
-                
-                for nt_to_process in list(nt_step3):
-                    if nt_to_process in grammar_step3:
-                        all_current_nts_for_lr = set(nt_step3) | newly_added_nts_step3
-                        new_nt_name = eliminate_direct_left_recursion(grammar_step3, nt_to_process, all_current_nts_for_lr)
-                        if new_nt_name: newly_added_nts_step3.add(new_nt_name)
-                
-                final_non_terminals_step3_set = set(nt_step3) | newly_added_nts_step3
-                final_non_terminals_step3 = sorted([nt for nt in final_non_terminals_step3_set if nt in grammar_step3 and grammar_step3[nt]])
-                final_grammar_step3 = {nt: grammar_step3[nt] for nt in final_non_terminals_step3}
-                print_grammar(final_grammar_step3, title="3. After Direct Left Recursion Elimination")
-                print(f"Non-Terminals: {final_non_terminals_step3}")
-                current_grammar, current_nt = final_grammar_step3, final_non_terminals_step3
-            
-            if current_grammar:
-                grammar_step4 = {k: [p[:] for p in v] for k, v in current_grammar.items()}
-                nt_step4 = list(current_nt)
-                substitute_to_start_terminals(grammar_step4, nt_step4)
-                final_non_terminals_step4 = sorted([nt for nt in nt_step4 if nt in grammar_step4 and grammar_step4[nt]])
-                final_grammar_step4 = {nt: grammar_step4[nt] for nt in final_non_terminals_step4}
-                print_grammar(final_grammar_step4, title="4. After Substitution to Start Terminals (Simplified)")
-                print(f"Non-Terminals: {final_non_terminals_step4}")
-                current_grammar, current_nt = final_grammar_step4, final_non_terminals_step4
-            
-            if current_grammar:
-                final_gnf_grammar, final_gnf_non_terminals = finalize_gnf_rhs(current_grammar, current_nt, original_non_terminals)
-                print_grammar(final_gnf_grammar, title="5. Final GNF Grammar")
-                print(f"Non-Terminals: {final_gnf_non_terminals}")
-            
-        else:
+        try:
+            grammar = Grammar.parse(cfg_text)
+        except GrammarError as error:
+            print(f"Error: {error}")
             print(f"Failed to parse grammar for {test_name}.")
-        print("--------------------------------------")
\ No newline at end of file
+            print("--------------------------------------")
+            continue
+
+        print_grammar(grammar.to_dict(), title="Original Grammar")
+        print(f"\nStart Symbol: {grammar.names[grammar.start]}")
+        print(f"Non-Terminals: {grammar.active_nonterminals()}")
+        print(f"Terminals: {grammar.terminals()}")
+        nullable_set = {grammar.names[nt] for nt in find_nullable_non_terminals(grammar)}
+        print(f"Nullable Set: {nullable_set if nullable_set else 'None'}")
+        print(f"Generating: {sorted(grammar.names[nt] for nt in find_generating_non_terminals(grammar))}")
+        print(f"Reachable: {sorted(grammar.names[nt] for nt in find_reachable_non_terminals(grammar))}")
+
+        # Stages 1 and 2 are shown for reference; the pipeline runs the whole conversion itself.
+        stage = eliminate_epsilon_productions(grammar)
+        print_grammar(stage.to_dict(), title="1. After Epsilon Elimination")
+        print(f"Non-Terminals: {stage.active_nonterminals()}")
+
+        stage = eliminate_unit_productions(stage)
+        print_grammar(stage.to_dict(), title="2. After Unit Production Elimination")
+        print(f"Non-Terminals: {stage.active_nonterminals()}")
+
+        try:
+            gnf, stats = pipeline.run(grammar)
+        except GrammarLimitError as error:
+            print(f"Error: {error}")
+        else:
+            print_grammar(gnf.to_dict(), title="3. Final GNF Grammar")
+            print(f"Non-Terminals: {gnf.active_nonterminals()}")
+            print(f"Size: {stats.input_productions} -> {stats.output_productions} productions "
+                  f"({stats.blowup:.1f}x symbols, peak {stats.peak_productions}, "
+                  f"{stats.nonterminals_added} new non-terminals)")
+        print("--------------------------------------")
+
+    # A rule that ends up useless changes the first two stages' input only; the rest is cached.
+    edited = Grammar.parse(sample_cfg_text_2 + "\n    G -> g G | g")
+    gnf, stats = pipeline.run(edited)
+    print(f"\nExample 2 with an unused rule added: reran "
+          f"{[name for name, _ in stats.stages if name not in stats.cached_stages]}, reused {stats.cached_stages}")
@@ -1,13 +1,25 @@
 # test_gnf_converter.py
+import io
+import mmap
+import os
+import tempfile
 import unittest
 from gnf_converter import (
+    Grammar,
+    GrammarError,
+    GrammarLimitError,
+    GrammarSyntaxError,
     parse_grammar,
     find_nullable_non_terminals,
+    find_generating_non_terminals,
+    find_reachable_non_terminals,
     eliminate_epsilon_productions,
     eliminate_unit_productions,
     eliminate_direct_left_recursion,
     substitute_to_start_terminals,
-    finalize_gnf_rhs
+    finalize_gnf_rhs,
+    convert_to_gnf,
+    GNFPipeline
 )
 
 class TestGNFConverter(unittest.TestCase):
@@ -71,6 +83,28 @@ class TestGNFConverter(unittest.TestCase):
          nullable = find_nullable_non_terminals(grammar, nt)
          self.assertEqual(nullable, set())
 
+    def test_nullable_long_chain(self):
+        n = 3000
+        text = "\n".join(f"A{i} -> A{i+1} A{i+1} | x" for i in range(n)) + f"\nA{n} -> eps"
+        grammar = Grammar.parse(text)
+        self.assertEqual(len(find_nullable_non_terminals(grammar)), n + 1)
+
+    def test_generating_and_reachable(self):
+        grammar = {'S': [['A', 'b'], ['B']], 'A': [['A', 'a']], 'B': [['b']], 'C': [['c']], 'D': [['S']]}
+        nt = ['S', 'A', 'B', 'C', 'D']
+        self.assertEqual(find_generating_non_terminals(grammar, nt), {'S', 'B', 'C', 'D'})
+        self.assertEqual(find_reachable_non_terminals(grammar, nt, 'S'), {'S', 'A', 'B'})
+        g = Grammar.parse("S -> A b | B\nA -> A a\nB -> b\nC -> c\nD -> S")
+        self.assertEqual({g.names[x] for x in find_generating_non_terminals(g)}, {'S', 'B', 'C', 'D'})
+        self.assertEqual({g.names[x] for x in find_reachable_non_terminals(g)}, {'S', 'A', 'B'})
+
+    def test_eliminate_epsilon_drops_undefined_chain(self):
+        grammar = {'S': [['B', 'a'], ['a']], 'B': [['C', 'b']], 'C': [['D', 'c']], 'D': [['!epsilon']]}
+        nt = ['S', 'B', 'C', 'D']
+        g_no_eps, nt_no_eps = eliminate_epsilon_productions(grammar, nt, 'S', set(nt))
+        self.assertEqual(g_no_eps, {'S': [['B', 'a'], ['a']], 'B': [['C', 'b']], 'C': [['c']]})
+        self.assertEqual(nt_no_eps, ['B', 'C', 'S'])
+
     def test_eliminate_epsilon_basic(self):
         grammar = {'S': [['A'], ['a']], 'A': [['!epsilon']]}
         nt = ['S', 'A']; start = 'S'; orig_nt = set(nt)
@@ -119,6 +153,22 @@ class TestGNFConverter(unittest.TestCase):
         self.assertEqual(g_no_unit, expected_g)
         self.assertCountEqual(nt_no_unit, ['A', 'B', 'S'])
 
+    def test_eliminate_unit_chain_of_cycles(self):
+        grammar = {'S': [['A'], ['s']], 'A': [['B']], 'B': [['A'], ['C'], ['b', 'B']], 'C': [['D'], ['c']], 'D': [['C']]}
+        nt = ['S', 'A', 'B', 'C', 'D']
+        g_no_unit, nt_no_unit = eliminate_unit_productions(grammar, nt)
+        self.assertEqual(g_no_unit, {'S': [['b', 'B'], ['c'], ['s']], 'A': [['b', 'B'], ['c']], 'B': [['b', 'B'], ['c']],
+                                     'C': [['c']], 'D': [['c']]})
+        self.assertEqual(nt_no_unit, ['A', 'B', 'C', 'D', 'S'])
+
+    def test_eliminate_unit_large_cycle_shares_productions(self):
+        n = 5000
+        text = "\n".join(f"A{i} -> A{(i + 1) % n} | a{i}" for i in range(n))
+        g = eliminate_unit_productions(Grammar.parse(text))
+        first = g.productions[g.ids['A0']]
+        self.assertEqual(len(first), n)
+        self.assertTrue(all(g.productions[g.ids[f"A{i}"]] is first for i in range(n)))
+
     def test_eliminate_left_recursion_simple(self):
         grammar = {'E': [['E', '+', 'T'], ['T']], 'T':[]}
         nt_all = {'E', 'T'}
@@ -179,5 +229,253 @@ class TestGNFConverter(unittest.TestCase):
                  for symbol_idx, symbol_test in enumerate(p_test[1:]):
                       self.assertIn(symbol_test, nt5_final)
 
+def language(grammar, max_length):
+    # Terminal strings of at most max_length symbols derivable from the start symbol.
+    derived = {nt: set() for nt in grammar.nonterminals}
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhss in grammar.productions.items():
+            for rhs in rhss:
+                strings = {()}
+                for symbol in rhs:
+                    options = derived[symbol] if symbol in grammar.nonterminals else {(grammar.names[symbol],)}
+                    strings = {s + o for s in strings for o in options if len(s) + len(o) <= max_length}
+                if not strings <= derived[lhs]:
+                    derived[lhs] |= strings
+                    changed = True
+    return derived[grammar.start]
+
+
+class TestGrammar(unittest.TestCase):
+
+    EXPR = """
+    E -> E + T | T
+    T -> T * F | F
+    F -> ( E ) | id
+    """
+
+    def test_parse_interns_symbols(self):
+        g = Grammar.parse("S -> a S | b | eps\nA -> a")
+        self.assertEqual(g.names[g.start], 'S')
+        self.assertEqual(g.productions[g.ids['S']], {(g.ids['a'], g.ids['S']): None, (g.ids['b'],): None, (): None})
+        self.assertEqual(g.active_nonterminals(), ['A', 'S'])
+        self.assertEqual(g.terminals(), ['a', 'b'])
+        self.assertEqual(g.to_dict(sort=False), {'S': [['a', 'S'], ['b'], ['!epsilon']], 'A': [['a']]})
+
+    def test_parse_errors(self):
+        for text in ("", "S a", " -> a", "S -> | "):
+            with self.assertRaises(GrammarError):
+                Grammar.parse(text)
+
+    def test_syntax_error_position(self):
+        with self.assertRaises(GrammarSyntaxError) as caught:
+            Grammar.parse("S -> a S\n\n   A b c\n")
+        self.assertEqual((caught.exception.line, caught.exception.column), (3, 9))
+        self.assertIn("line 3, column 9", str(caught.exception))
+        with self.assertRaises(GrammarSyntaxError) as caught:
+            Grammar.parse("S -> a\n  -> b")
+        self.assertEqual((caught.exception.line, caught.exception.column), (2, 3))
+
+    def test_read_sources(self):
+        text = "\ufeffS -> a S | b | eps\r\nA -> S ε\r\n"
+        expected = Grammar.parse(text.replace("\ufeff", "")).to_dict()
+        data = text.encode('utf-8')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "grammar.txt")
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertEqual(Grammar.read(path).to_dict(), expected)
+            with open(path, 'rb') as f:
+                self.assertEqual(Grammar.read(f).to_dict(), expected)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    self.assertEqual(Grammar.read(mapped).to_dict(), expected)
+        self.assertEqual(Grammar.read(data).to_dict(), expected)
+        self.assertEqual(Grammar.read(memoryview(data)).to_dict(), expected)
+        self.assertEqual(Grammar.read(memoryview(b"S -> a\nT -> b\n")[7:]).to_dict(), {'T': [['b']]})
+        self.assertEqual(Grammar.read(memoryview(bytearray(b"S -> a\nT -> b\n"))[:7]).to_dict(), {'S': [['a']]})
+        self.assertEqual(Grammar.read(io.StringIO(text)).to_dict(), expected)
+        self.assertEqual(Grammar.read(io.BytesIO(data)).to_dict(), expected)
+
+    def test_read_large(self):
+        n = 20000
+        data = "".join(f"N{i} -> t{i % 7} N{(i + 1) % n} | N{(i * 3) % n} t{i % 5} | u\n" for i in range(n)).encode()
+        g = Grammar.read(data)
+        self.assertEqual(len(g.productions), n)
+        self.assertEqual(len(g.names), n + 7 + 1)
+        self.assertEqual(g.names[g.start], 'N0')
+        self.assertEqual(g.productions[g.ids['N5']], {(g.ids['t5'], g.ids['N6']): None, (g.ids['N15'], g.ids['t0']): None,
+                                                      (g.ids['u'],): None})
+
+    def test_from_dict_round_trip(self):
+        grammar = {'S': [['A', 'B'], ['!epsilon']], 'A': [['a']], 'B': [['b', 'S']]}
+        g = Grammar.from_dict(grammar, ['S', 'A', 'B'], 'S')
+        self.assertEqual(g.to_dict(sort=False), grammar)
+        self.assertEqual(g.terminals(), ['a', 'b'])
+
+    def test_copy_does_not_share_production_sets(self):
+        g = Grammar.parse("S -> a")
+        other = g.copy()
+        other.add(other.nonterminal('T'), (other.intern('t'),))
+        self.assertEqual(g.to_dict(), {'S': [['a']]})
+        self.assertNotIn('T', g.ids)
+
+    def test_stages_on_grammar_match_dict_api(self):
+        for text in (self.EXPR, "S -> A B | a\nA -> b S | c\nB -> S a | epsilon", "S -> A | B | c\nA -> B | a\nB -> S | b"):
+            d, nt, _, start, orig = parse_grammar(text)
+            d1, nt1 = eliminate_epsilon_productions(d, nt, start, orig)
+            d2, nt2 = eliminate_unit_productions(d1, nt1)
+
+            g = Grammar.parse(text)
+            self.assertEqual({g.names[x] for x in find_nullable_non_terminals(g)}, find_nullable_non_terminals(d, nt))
+            g = eliminate_epsilon_productions(g)
+            self.assertEqual(g.to_dict(), d1)
+            g = eliminate_unit_productions(g)
+            self.assertEqual(g.to_dict(), d2)
+            self.assertEqual(g.active_nonterminals(), nt2)
+
+    def test_binarized_epsilon_elimination_keeps_language(self):
+        text = "S -> A B c A C | C C\nA -> a | eps\nB -> b B | eps\nC -> A B | c"
+        g = Grammar.parse(text)
+        plain = eliminate_epsilon_productions(g)
+        binarized = eliminate_epsilon_productions(g, binarize=True)
+        self.assertEqual(language(binarized, 6), language(g, 6))
+        self.assertEqual(language(plain, 6), language(g, 6))
+        self.assertTrue(any(nt.startswith('S_') for nt in binarized.active_nonterminals()))
+        for rhss in binarized.productions.values():
+            self.assertTrue(all(len(rhs) <= 2 for rhs in rhss))
+
+    def test_epsilon_elimination_limit(self):
+        k = 16
+        text = "S -> " + " ".join(f"A{i}" for i in range(k)) + "\n" + "\n".join(f"A{i} -> a{i} | eps" for i in range(k))
+        g = Grammar.parse(text)
+        with self.assertRaises(GrammarLimitError) as caught:
+            eliminate_epsilon_productions(g, max_productions=1000)
+        self.assertEqual(caught.exception.limit, 1000)
+        self.assertIn("S -> A0 A1", str(caught.exception))
+        binarized = eliminate_epsilon_productions(g, binarize=True, max_productions=1000)
+        self.assertLess(sum(map(len, binarized.productions.values())), 4 * k + 2)
+        grammar, nt, _, start, orig = parse_grammar(text)
+        with self.assertRaises(GrammarLimitError):
+            eliminate_epsilon_productions(grammar, nt, start, orig, max_productions=1000)
+
+    def test_finalize_keeps_introduced_non_terminals(self):
+        g = eliminate_unit_productions(eliminate_epsilon_productions(Grammar.parse(self.EXPR)))
+        for nt in g.active_nonterminals():
+            eliminate_direct_left_recursion(g, nt)
+        substitute_to_start_terminals(g)
+        final = finalize_gnf_rhs(g).to_dict()
+        self.assertEqual(final["E'"], [['+', 'T', "E'"], ['+', 'T']])
+        self.assertEqual(final['X__'], [[')']])
+        for prods in final.values():
+            for prod in prods:
+                self.assertNotIn(prod[0], final)
+                for symbol in prod[1:]:
+                    self.assertIn(symbol, final)
+
+class TestConvertToGNF(unittest.TestCase):
+
+    EXAMPLES = [
+        "S -> A B | a\nA -> b S | c\nB -> S a | epsilon",
+        "E -> E + T | T\nT -> T * F | F\nF -> ( E ) | id",
+        "S -> A a A | B b B | epsilon\nA -> epsilon\nB -> epsilon\nC -> A B\nD -> C c",
+        "S -> A | B | c\nA -> B | a\nB -> S | b",
+        "S -> A a | b\nA -> S c | A d | e",
+        "S -> S S | ( S ) | eps",
+    ]
+
+    def assertGNF(self, gnf):
+        for lhs, rhss in gnf.productions.items():
+            for rhs in rhss:
+                if not rhs:
+                    self.assertEqual(lhs, gnf.start)
+                    continue
+                self.assertNotIn(rhs[0], gnf.nonterminals)
+                for symbol in rhs[1:]:
+                    self.assertIn(symbol, gnf.productions)
+
+    def test_examples_keep_language(self):
+        for text in self.EXAMPLES:
+            g = Grammar.parse(text)
+            gnf, stats = convert_to_gnf(g)
+            self.assertGNF(gnf)
+            self.assertEqual(language(gnf, 6), language(g, 6), text)
+            self.assertEqual(stats.output_productions, sum(map(len, gnf.to_dict().values())))
+
+    def test_indirect_left_recursion_cycle(self):
+        n = 40
+        text = "\n".join(f"A{i} -> A{(i + 1) % n} a{i} | b{i}" for i in range(n))
+        g = Grammar.parse(text)
+        gnf, stats = convert_to_gnf(g)
+        self.assertGNF(gnf)
+        self.assertEqual(language(gnf, 4), language(g, 4))
+        self.assertLess(stats.output_productions, 4 * n)
+
+    def test_limit_raises_and_leaves_input(self):
+        g = Grammar.parse(self.EXAMPLES[1])
+        before = g.to_dict()
+        with self.assertRaises(GrammarLimitError) as caught:
+            convert_to_gnf(g, max_productions=10)
+        self.assertEqual(caught.exception.stage, "GNF conversion")
+        self.assertEqual(g.to_dict(), before)
+        gnf, stats = convert_to_gnf(g, max_productions=20)
+        self.assertEqual(stats.output_productions, 20)
+
+    def test_stats(self):
+        gnf, stats = convert_to_gnf(Grammar.parse(self.EXAMPLES[4]))
+        info = stats.as_dict()
+        self.assertEqual([stage['stage'] for stage in info['stages']], ['epsilon', 'unit', 'left corners', 'gnf'])
+        self.assertEqual(info['input_productions'], 5)
+        self.assertEqual(info['output_productions'], gnf.production_count())
+        self.assertGreaterEqual(info['peak_productions'], info['output_productions'])
+        self.assertEqual(info['input_symbols'], 13)
+        self.assertAlmostEqual(info['blowup'], gnf.size() / 13)
+        self.assertEqual(info['nonterminals_added'], 2)
+
+class TestGNFPipeline(unittest.TestCase):
+
+    EXPR = "E -> E + T | T\nT -> T * F | F\nF -> ( E ) | id"
+
+    def test_matches_convert_to_gnf(self):
+        pipeline = GNFPipeline()
+        for text in TestConvertToGNF.EXAMPLES:
+            expected, _ = convert_to_gnf(Grammar.parse(text))
+            gnf, stats = pipeline.run(Grammar.parse(text))
+            self.assertEqual(gnf.to_dict(), expected.to_dict())
+            self.assertEqual(stats.cached_stages, [])
+
+    def test_second_run_is_cached(self):
+        pipeline = GNFPipeline()
+        first, _ = pipeline.run(Grammar.parse(self.EXPR))
+        first.productions.clear()
+        # Same grammar with the rules and alternatives in another order.
+        second, stats = pipeline.run(Grammar.parse("E -> T | E + T\nF -> id | ( E )\nT -> F | T * F"))
+        self.assertEqual(stats.cached_stages, list(GNFPipeline.STAGES))
+        self.assertEqual(second.to_dict(), convert_to_gnf(Grammar.parse(self.EXPR))[0].to_dict())
+
+    def test_edited_rule_reruns_changed_stages(self):
+        pipeline = GNFPipeline()
+        pipeline.run(Grammar.parse(self.EXPR))
+        _, stats = pipeline.run(Grammar.parse(self.EXPR + "\nG -> g G"))
+        self.assertEqual(stats.cached_stages, ['left corners', 'gnf'])
+        _, stats = pipeline.run(Grammar.parse(self.EXPR.replace("id", "num")))
+        self.assertEqual(stats.cached_stages, [])
+
+    def test_lru_eviction(self):
+        pipeline = GNFPipeline(cache_size=3)
+        pipeline.run(Grammar.parse(self.EXPR))
+        self.assertEqual(len(pipeline._memory), 3)
+        _, stats = pipeline.run(Grammar.parse(self.EXPR))
+        self.assertEqual(stats.cached_stages, [])
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            GNFPipeline(cache_size=0, cache_dir=cache_dir).run(Grammar.parse(self.EXPR))
+            pipeline = GNFPipeline(cache_dir=cache_dir)
+            gnf, stats = pipeline.run(Grammar.parse(self.EXPR))
+            self.assertEqual(stats.cached_stages, list(GNFPipeline.STAGES))
+            self.assertEqual(pipeline.hits, 4)
+            self.assertEqual(gnf.to_dict(), convert_to_gnf(Grammar.parse(self.EXPR))[0].to_dict())
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file
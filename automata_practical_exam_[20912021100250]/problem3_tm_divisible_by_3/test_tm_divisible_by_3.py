@@ -1,6 +1,68 @@
 # test_tm_divisible_by_3.py
+import random
 import unittest
-from tm_divisible_by_3 import TuringMachine, create_divisible_by_3_tm
+from tm_divisible_by_3 import (
+    NondeterministicTM,
+    Result,
+    Run,
+    Tape,
+    TuringMachine,
+    create_divisibility_tm,
+    create_divisible_by_3_tm,
+    is_divisible
+)
+
+
+def create_bounce_tm():
+    # Walks right to the first blank, then left past the start of the input, marks that cell
+    # with 'x' and walks right again; accepts when it is back on that mark.
+    transitions = {
+        'right': {'0': ('right', '0', 'R'), '1': ('right', '1', 'R'), '_': ('left', '_', 'L')},
+        'left': {'0': ('left', '1', 'L'), '1': ('left', '0', 'L'), '_': ('check', 'x', 'R')},
+        'check': {'0': ('check', '0', 'R'), '1': ('check', '1', 'R'), '_': ('back', '_', 'L')},
+        'back': {'0': ('back', '0', 'L'), '1': ('back', '1', 'L'), 'x': ('accept', 'x', 'S')},
+    }
+    return TuringMachine({'right', 'left', 'check', 'back', 'accept', 'reject'}, {'0', '1'},
+                         {'0', '1', '_', 'x'}, transitions, 'right', 'accept', 'reject', '_')
+
+
+def reference_simulate(tm, input_string, max_steps):
+    # The original one-step-at-a-time interpreter over a dict tape.
+    if not all(c in tm.input_alphabet for c in input_string):
+        return False
+    tape = dict(enumerate(input_string))
+    state, head, steps = tm.start_state, 0, 0
+    while steps < max_steps:
+        if state == tm.accept_state:
+            return True
+        if state == tm.reject_state:
+            return False
+        rules = tm.transitions.get(state, {})
+        symbol = tape.get(head, tm.blank_symbol)
+        if symbol not in rules:
+            return False
+        state, tape[head], direction = rules[symbol]
+        head += {'L': -1, 'S': 0, 'R': 1}[direction]
+        steps += 1
+    return False
+
+
+def random_tm(rng, num_states=3):
+    # Random machine over {0, 1, _} biased towards sweeps (same state, symbol unchanged).
+    working = [f's{i}' for i in range(num_states)]
+    targets = working + ['accept', 'reject']
+    transitions = {}
+    for state in working:
+        rules = {}
+        for symbol in '01_':
+            if rng.random() < 0.1:
+                continue
+            if rng.random() < 0.5:
+                rules[symbol] = (state, symbol, rng.choice('LR'))
+            else:
+                rules[symbol] = (rng.choice(targets), rng.choice('01_'), rng.choice('LRS'))
+        transitions[state] = rules
+    return TuringMachine(set(targets), {'0', '1'}, {'0', '1', '_'}, transitions, 's0', 'accept', 'reject', '_')
 
 class TestTuringMachineDivisibleBy3(unittest.TestCase):
 
@@ -57,6 +119,372 @@ class TestTuringMachineDivisibleBy3(unittest.TestCase):
     def test_long_string_reject(self):
         self.run_tm_test("110110111", False)
 
+    def test_compiled_table(self):
+        compiled = self.tm.compile()
+        self.assertIs(self.tm.compile(), compiled)
+        self.assertEqual(compiled.states[:compiled.halt_from], ['q_rem0', 'q_rem1', 'q_rem2'])
+        self.assertEqual(compiled.symbols[0], '⊔')
+        one = compiled.symbol_code['1']
+        self.assertEqual(compiled.table[compiled.start * compiled.width + one],
+                         (compiled.state_code['q_rem1'], one, 1))
+
+    def test_invalid_machine_rejected_at_compile_time(self):
+        with self.assertRaises(ValueError):
+            TuringMachine({'a', 'y', 'n'}, {'0'}, {'0', '_'}, {'a': {'0': ('a', '0', 'X')}}, 'a', 'y', 'n', '_')
+        with self.assertRaises(ValueError):
+            TuringMachine({'a', 'y', 'n'}, {'0'}, {'0', '_'}, {'a': {'0': ('b', '0', 'R')}}, 'a', 'y', 'n', '_')
+
+    def test_missing_transition_rejects(self):
+        tm = TuringMachine({'a', 'y', 'n'}, {'0', '1'}, {'0', '1', '_'},
+                           {'a': {'0': ('a', '0', 'R'), '_': ('y', '_', 'S')}}, 'a', 'y', 'n', '_')
+        self.assertTrue(tm.simulate("000"))
+        self.assertFalse(tm.simulate("010"))
+        self.assertFalse(tm.simulate("000", max_steps=3))
+
+class TestTape(unittest.TestCase):
+
+    def test_grows_in_both_directions(self):
+        tape = Tape([1, 2, 1])
+        tape.write(-3, 2)
+        tape.write(200, 1)
+        self.assertEqual(tape.read(-3), 2)
+        self.assertEqual(tape.read(-2), 0)
+        self.assertEqual(tape.read(1), 2)
+        self.assertEqual(tape.read(200), 1)
+        self.assertEqual(tape.read(-10 ** 6), 0)
+        self.assertEqual(tape.contents('_ab'), 'b__aba' + '_' * 197 + 'a')
+        self.assertEqual(tape.cells.itemsize, 1)
+
+    def test_machine_moving_left_of_input(self):
+        tm = create_bounce_tm()
+        self.assertTrue(tm.simulate("0110", max_steps=21))
+        self.assertFalse(tm.simulate("0110", max_steps=20))
+        self.assertTrue(tm.simulate("1" * 5000, max_steps=20005))
+
+    def test_sweeps_count_every_step(self):
+        rng = random.Random(31)
+        for _ in range(300):
+            tm = random_tm(rng)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(12)))
+            for max_steps in range(0, 40):
+                self.assertEqual(tm.simulate(s, max_steps=max_steps), reference_simulate(tm, s, max_steps),
+                                 f"{tm.transitions} on '{s}' with {max_steps} steps")
+
+    def test_long_sweep_is_one_macro_step(self):
+        tm = create_bounce_tm()
+        sweeps = [sweep for sweep in tm.compile().sweeps if sweep is not None]
+        self.assertEqual(len(sweeps), 6)
+        n = 200000
+        self.assertTrue(tm.simulate('01' * n, max_steps=8 * n + 5))
+        self.assertFalse(tm.simulate('01' * n, max_steps=8 * n + 4))
+
+    def test_many_symbols_use_wide_cells(self):
+        alphabet = [chr(0x100 + i) for i in range(300)]
+        transitions = {'scan': {s: ('scan', s, 'R') for s in alphabet}}
+        transitions['scan']['_'] = ('accept', '_', 'S')
+        tm = TuringMachine({'scan', 'accept', 'reject'}, alphabet, alphabet + ['_'], transitions,
+                           'scan', 'accept', 'reject', '_')
+        self.assertTrue(tm.simulate(''.join(alphabet)))
+        self.assertEqual(tm._initialize_tape(alphabet[-1]).cells.itemsize, 4)
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def test_evaluate_reports_why_a_run_ended(self):
+        tm = create_divisible_by_3_tm()
+        self.assertIs(tm.evaluate("110"), Result.ACCEPT)
+        self.assertIs(tm.evaluate("111"), Result.REJECT)
+        self.assertIs(tm.evaluate("1021"), Result.REJECT)
+        self.assertIs(tm.evaluate("11" * 1000), Result.BUDGET_EXHAUSTED)
+        self.assertIs(tm.evaluate("11" * 1000, max_steps=None), Result.ACCEPT)
+        self.assertTrue(tm.simulate("11" * 1000, max_steps=None))
+
+    def test_evaluate_detects_loops(self):
+        states = {'a', 'b', 'y', 'n'}
+        ping_pong = TuringMachine(states, {'0'}, {'0', '_'},
+                                  {'a': {'0': ('b', '0', 'R'), '_': ('b', '_', 'R')},
+                                   'b': {'0': ('a', '0', 'L'), '_': ('a', '_', 'L')}}, 'a', 'y', 'n', '_')
+        self.assertIs(ping_pong.evaluate("000", max_steps=None), Result.LOOP)
+        self.assertIs(ping_pong.evaluate("000", detect_loops=False), Result.BUDGET_EXHAUSTED)
+        runaway = TuringMachine(states, {'0'}, {'0', '_'}, {'a': {'0': ('a', '0', 'R'), '_': ('a', '_', 'R')}},
+                                'a', 'y', 'n', '_')
+        self.assertIs(runaway.evaluate("0" * 100, max_steps=None), Result.LOOP)
+        # Grows the tape forever, so no configuration ever repeats.
+        grower = TuringMachine(states | {'c', 'd'}, {'0'}, {'0', '_'},
+                               {'a': {'_': ('b', '0', 'R')}, 'b': {'_': ('c', '0', 'L')},
+                                'c': {'0': ('d', '0', 'R')}, 'd': {'0': ('a', '0', 'R')}}, 'a', 'y', 'n', '_')
+        self.assertIs(grower.evaluate("", max_steps=5000), Result.BUDGET_EXHAUSTED)
+
+    def test_evaluate_agrees_with_reference(self):
+        rng = random.Random(37)
+        for _ in range(300):
+            tm = random_tm(rng)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(8)))
+            result = tm.evaluate(s, max_steps=2000)
+            if result is Result.LOOP:
+                self.assertFalse(reference_simulate(tm, s, 5000))
+                self.assertIs(tm.evaluate(s, max_steps=5000, detect_loops=False), Result.BUDGET_EXHAUSTED)
+            else:
+                self.assertEqual(result is Result.ACCEPT, reference_simulate(tm, s, 2000))
+
+
+class TestProfile(unittest.TestCase):
+
+    def test_profile_counts_every_step(self):
+        stats = create_bounce_tm().profile("0110", max_steps=21)
+        self.assertIs(stats.result, Result.ACCEPT)
+        self.assertEqual(stats.steps, 20)
+        self.assertEqual(stats.final_state, 'accept')
+        self.assertEqual(stats.transitions['right', '0'], 2)
+        self.assertEqual(stats.transitions['check', '1'], 2)
+        self.assertEqual(stats.states, {'right': 5, 'left': 5, 'check': 5, 'back': 5})
+        self.assertEqual(stats.symbols, {'0': 8, '1': 8, '_': 3, 'x': 1})
+        self.assertEqual((stats.head_min, stats.head_max), (-1, 4))
+        self.assertEqual(stats.as_dict()['result'], 'accept')
+
+        rng = random.Random(41)
+        for _ in range(100):
+            tm = random_tm(rng)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(8)))
+            stats = tm.profile(s, max_steps=50)
+            self.assertIs(stats.result, tm.evaluate(s, max_steps=50, detect_loops=False))
+            self.assertEqual(sum(stats.transitions.values()), stats.steps)
+
+
+class TestSimulateMany(unittest.TestCase):
+
+    def test_simulate_many(self):
+        tm = create_divisible_by_3_tm()
+        rng = random.Random(43)
+        inputs = [''.join(rng.choice('01') for _ in range(rng.randrange(30))) for _ in range(1000)] + ["1021"]
+        expected = [tm.simulate(s) for s in inputs]
+        self.assertEqual(list(tm.simulate_many(inputs, workers=1, chunksize=7)), expected)
+        self.assertEqual(list(tm.simulate_many(iter(inputs), workers=2, chunksize=50)), expected)
+        unordered = dict(tm.simulate_many(inputs, workers=2, chunksize=30, ordered=False))
+        self.assertEqual([unordered[i] for i in range(len(inputs))], expected)
+        self.assertEqual(list(tm.simulate_many([], workers=2)), [])
+        with self.assertRaises(ValueError):
+            tm.simulate_many(inputs, chunksize=0)
+
+
+class TestRightMovingMachines(unittest.TestCase):
+
+    def test_right_moving_fast_path(self):
+        tm = create_divisible_by_3_tm()
+        self.assertIsNotNone(tm.compile().right_rows)
+        self.assertIsNone(create_bounce_tm().compile().right_rows)
+        s = '1101' * 50000
+        expected = int(s, 2) % 3 == 0
+        self.assertEqual(tm.simulate(s, max_steps=len(s) + 1), expected)
+        self.assertIs(tm.evaluate(s, max_steps=len(s)), Result.BUDGET_EXHAUSTED)
+        self.assertIs(tm.evaluate(s + '2'), Result.REJECT)
+
+        # Writing on the cell and staying there, halting mid-input, and running off into blanks.
+        states = {'a', 'b', 'c', 'y', 'n'}
+        stays = TuringMachine(states, {'0', '1'}, {'0', '1', '_'},
+                              {'a': {'0': ('b', '1', 'S'), '1': ('a', '1', 'R'), '_': ('c', '_', 'R')},
+                               'b': {'1': ('a', '0', 'R')}, 'c': {'_': ('a', '_', 'S')}}, 'a', 'y', 'n', '_')
+        self.assertIs(stays.evaluate("0101", max_steps=None), Result.LOOP)
+        self.assertIs(stays.evaluate("0101", max_steps=100, detect_loops=False), Result.BUDGET_EXHAUSTED)
+        spinner = TuringMachine(states, {'0', '1'}, {'0', '1', '_'},
+                                {'a': {'0': ('b', '0', 'S'), '1': ('y', '1', 'R')},
+                                 'b': {'0': ('a', '0', 'S')}}, 'a', 'y', 'n', '_')
+        self.assertIs(spinner.evaluate("10", max_steps=None), Result.ACCEPT)
+        self.assertIs(spinner.evaluate("01", max_steps=None), Result.LOOP)
+        self.assertIs(spinner.evaluate("1", max_steps=1), Result.BUDGET_EXHAUSTED)
+
+    def test_right_moving_machines_agree_with_reference(self):
+        rng = random.Random(47)
+        for _ in range(300):
+            tm = random_tm(rng)
+            for rules in tm.transitions.values():
+                for symbol, (state, write, direction) in rules.items():
+                    rules[symbol] = (state, write, 'R' if direction == 'L' else direction)
+            tm = TuringMachine(tm.states, tm.input_alphabet, tm.tape_alphabet, tm.transitions,
+                               tm.start_state, tm.accept_state, tm.reject_state, tm.blank_symbol)
+            self.assertIsNotNone(tm.compile().right_rows)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(10)))
+            for max_steps in range(0, 30):
+                self.assertEqual(tm.simulate(s, max_steps=max_steps), reference_simulate(tm, s, max_steps),
+                                 f"{tm.transitions} on '{s}' with {max_steps} steps")
+
+
+class TestRun(unittest.TestCase):
+
+    def test_run_in_slices(self):
+        rng = random.Random(53)
+        for _ in range(200):
+            tm = random_tm(rng)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(10)))
+            budget = rng.randrange(60)
+            run = tm.start(s)
+            while run.steps < budget and not run.halted:
+                run.step(min(rng.randrange(1, 5), budget - run.steps))
+                if rng.random() < 0.3:
+                    run = Run.restore(tm, run.snapshot())
+            result = run.run_until(budget)
+            self.assertIs(result, tm.evaluate(s, max_steps=budget, detect_loops=False))
+            self.assertEqual(result is Result.ACCEPT, reference_simulate(tm, s, budget))
+
+    def test_run_snapshot(self):
+        tm = create_bounce_tm()
+        run = tm.start("0110")
+        self.assertIs(run.step(12), Result.BUDGET_EXHAUSTED)
+        self.assertEqual((run.state_name, run.head), ('check', 2))
+        data = run.snapshot()
+        restored = Run.restore(tm, data)
+        self.assertEqual((restored.state_name, restored.head, restored.steps), ('check', 2, 12))
+        self.assertEqual(restored.tape.contents(tm.compile().symbols), 'x1001')
+        self.assertIs(restored.run_until(1000), Result.ACCEPT)
+        self.assertEqual(restored.steps, 20)
+        self.assertIs(Run.restore(tm, restored.snapshot()).step(), Result.ACCEPT)
+        with self.assertRaises(ValueError):
+            Run.restore(create_divisible_by_3_tm(), data)
+        with self.assertRaises(ValueError):
+            Run.restore(tm, data[:10])
+        with self.assertRaises(ValueError):
+            Run.restore(tm, b'XXXX' + data[4:])
+        self.assertIs(tm.start("2").step(), Result.REJECT)
+
+    def test_resume_after_long_blank_sweep(self):
+        # The sweep over blanks leaves the head 10**8 cells past the input without allocating them,
+        # and resuming it must not allocate them either.
+        tm = TuringMachine({'a', 'b', 'y', 'n'}, {'0', '1'}, {'0', '1', '_'},
+                           {'a': {'0': ('a', '1', 'R'), '1': ('b', '1', 'L'), '_': ('a', '_', 'R')},
+                            'b': {'0': ('a', '0', 'R')}}, 'a', 'y', 'n', '_')
+        run = tm.start("00")
+        self.assertIs(run.step(10 ** 8), Result.BUDGET_EXHAUSTED)
+        self.assertIs(run.step(1), Result.BUDGET_EXHAUSTED)
+        run = Run.restore(tm, run.snapshot())
+        self.assertIs(run.step(10 ** 8), Result.BUDGET_EXHAUSTED)
+        self.assertEqual((run.head, run.steps), (2 * 10 ** 8 + 1, 2 * 10 ** 8 + 1))
+        self.assertLess(len(run.tape.cells), 1000)
+        self.assertEqual(run.tape.contents(tm.compile().symbols), '11')
+        leftward = TuringMachine({'a', 'y', 'n'}, {'0'}, {'0', '_'}, {'a': {'0': ('a', '0', 'L'), '_': ('a', '_', 'L')}},
+                                 'a', 'y', 'n', '_')
+        run = leftward.start("0")
+        run.step(10 ** 8)
+        run.step(1)
+        self.assertEqual(run.head, -10 ** 8 - 1)
+        self.assertLess(len(run.tape.cells), 1000)
+
+
+class TestDivisibilityMachines(unittest.TestCase):
+
+    def test_same_machine_as_hand_written(self):
+        generated, hand_written = create_divisibility_tm(3), create_divisible_by_3_tm()
+        self.assertEqual(generated.transitions, hand_written.transitions)
+        self.assertEqual(generated.states, hand_written.states)
+
+    def test_any_modulus_and_base(self):
+        rng = random.Random(67)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+        for _ in range(100):
+            k, base = rng.randrange(1, 40), rng.randrange(2, 37)
+            tm = create_divisibility_tm(k, base)
+            for _ in range(5):
+                s = ''.join(rng.choice(digits[:base]) for _ in range(rng.randrange(1, 30)))
+                self.assertEqual(tm.simulate(s, max_steps=None), int(s, base) % k == 0, f"{s} base {base} mod {k}")
+
+    def test_streamed_chunks(self):
+        rng = random.Random(71)
+        s = ''.join(rng.choice('0123456789') for _ in range(5000))
+        remainder = 0
+        for digit in s:  # too long for int(s) under the default digit limit
+            remainder = (remainder * 10 + int(digit)) % 97
+        expected = remainder == 0
+        chunks = [s[i:i + 333] for i in range(0, len(s), 333)]
+        self.assertEqual(is_divisible(chunks, 97, 10), expected)
+        self.assertEqual(is_divisible((c.encode() for c in chunks), 97, 10), expected)
+        self.assertTrue(is_divisible([b'1' * 6 * 10000], 7, 10))  # 111111 = 7 * 15873
+        self.assertTrue(is_divisible([], 5))
+        self.assertTrue(is_divisible(['FF'], 17, 16))
+        self.assertTrue(is_divisible([b'f', b'F'], 15, 16))
+        for chunks, base in ((['11', '2', '0'], 2), (['1 2'], 10), (['-3'], 10), (['g'], 16)):
+            with self.assertRaises(ValueError, msg=chunks):
+                is_divisible(chunks, 3, base)
+
+        stream = create_divisible_by_3_tm().stream(max_steps=5)
+        stream.feed('11').feed('0')
+        self.assertIs(stream.result(), Result.ACCEPT)
+        self.assertIs(create_divisible_by_3_tm().stream(max_steps=4).feed('110').result(), Result.BUDGET_EXHAUSTED)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            create_divisibility_tm(0)
+        with self.assertRaises(ValueError):
+            create_divisibility_tm(3, base=37)
+        with self.assertRaises(ValueError):
+            create_bounce_tm().stream()
+
+
+class TestNondeterministicTM(unittest.TestCase):
+
+    def test_guessing_machine(self):
+        # Guesses where '101' starts, then checks it.
+        transitions = {
+            'g': {'0': [('g', '0', 'R')], '1': [('g', '1', 'R'), ('m1', '1', 'R')]},
+            'm1': {'0': ('m2', '0', 'R')},
+            'm2': {'1': ('y', '1', 'S')},
+        }
+        ntm = NondeterministicTM({'g', 'm1', 'm2', 'y', 'n'}, {'0', '1'}, {'0', '1', '_'}, transitions,
+                                 'g', 'y', 'n', '_')
+        rng = random.Random(59)
+        for _ in range(200):
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(15)))
+            self.assertEqual(ntm.simulate(s), '101' in s, s)
+        self.assertIs(ntm.evaluate("1111"), Result.REJECT)
+        self.assertIs(ntm.evaluate("12"), Result.REJECT)
+
+    def test_identical_configurations_are_explored_once(self):
+        # Two ways to take every step lead to the same configuration, so the frontier stays small
+        # instead of doubling with each symbol.
+        transitions = {'a': {'0': [('a', '0', 'R'), ('b', '0', 'S')], '_': [('y', '_', 'S')]},
+                       'b': {'0': [('a', '0', 'R')]}}
+        ntm = NondeterministicTM({'a', 'b', 'y', 'n'}, {'0'}, {'0', '_'}, transitions, 'a', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("0" * 200, max_frontier=2), Result.ACCEPT)
+        self.assertIs(ntm.evaluate("0" * 200, max_steps=201), Result.BUDGET_EXHAUSTED)
+
+        spread = {'a': {'_': [('a', '0', 'R'), ('a', '1', 'R')]}}
+        ntm = NondeterministicTM({'a', 'y', 'n'}, {'0'}, {'0', '1', '_'}, spread, 'a', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("", max_frontier=1000), Result.BUDGET_EXHAUSTED)
+
+        cycle = {'a': {'0': [('b', '1', 'S')]}, 'b': {'1': [('a', '0', 'S'), ('n', '1', 'S')]}}
+        ntm = NondeterministicTM({'a', 'b', 'y', 'n'}, {'0'}, {'0', '1', '_'}, cycle, 'a', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("0", max_steps=None), Result.LOOP)
+
+    def test_converging_branches_are_not_a_loop(self):
+        # Both branches step into the same configuration and then halt, which is a rejection.
+        states = {'q0', 'q1', 'q2', 'q3', 'y', 'n'}
+        merge = {'q0': {'0': [('q1', '0', 'R'), ('q2', '0', 'R')]},
+                 'q1': {'_': [('n', '_', 'R')]}, 'q2': {'_': [('n', '_', 'R')]}}
+        ntm = NondeterministicTM(states, {'0'}, {'0', '_'}, merge, 'q0', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("0"), Result.REJECT)
+        stuck = {'q0': {'0': [('q1', '0', 'R'), ('q2', '0', 'R')]},
+                 'q1': {'_': [('q3', '_', 'S')]}, 'q2': {'_': [('q3', '_', 'S')]}}
+        ntm = NondeterministicTM(states, {'0'}, {'0', '_'}, stuck, 'q0', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("0"), Result.REJECT)
+        # A short and a long path to the same configuration meet at different depths.
+        uneven = {'q0': {'0': [('q3', '0', 'S'), ('q1', '0', 'S')]},
+                  'q1': {'0': [('q2', '0', 'S')]}, 'q2': {'0': [('q3', '0', 'S')]}}
+        ntm = NondeterministicTM(states, {'0'}, {'0', '_'}, uneven, 'q0', 'y', 'n', '_')
+        self.assertIs(ntm.evaluate("0", max_steps=None), Result.REJECT)
+
+    def test_deterministic_machines_agree(self):
+        rng = random.Random(61)
+        for _ in range(200):
+            tm = random_tm(rng)
+            ntm = NondeterministicTM(tm.states, tm.input_alphabet, tm.tape_alphabet, tm.transitions,
+                                     tm.start_state, tm.accept_state, tm.reject_state, tm.blank_symbol)
+            s = ''.join(rng.choice('01') for _ in range(rng.randrange(8)))
+            for max_steps in (0, 5, 30):
+                self.assertEqual(ntm.simulate(s, max_steps), reference_simulate(tm, s, max_steps))
+
+    def test_invalid_machine(self):
+        with self.assertRaises(ValueError):
+            NondeterministicTM({'a', 'y', 'n'}, {'0'}, {'0'}, {'a': {'0': [('a', '0', 'R'), ('a', '0', 'X')]}},
+                               'a', 'y', 'n', '_')
+
 
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file
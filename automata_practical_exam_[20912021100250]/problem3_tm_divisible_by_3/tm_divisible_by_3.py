@@ -1,4 +1,217 @@
 # tm_divisible_by_3.py
+import multiprocessing
+import os
+import queue
+import struct
+import time
+import zlib
+from array import array
+from collections import deque
+from enum import Enum
+from itertools import islice
+
+# Step budget used when max_steps is None; large enough to never run out in practice.
+_UNBOUNDED = 1 << 62
+
+
+class Result(Enum):
+    ACCEPT = 'accept'
+    REJECT = 'reject'            # reject state reached, no transition, or invalid input
+    LOOP = 'loop'                # the run provably never halts
+    BUDGET_EXHAUSTED = 'budget'  # max_steps ran out first
+
+
+class Tape:
+    # Contiguous tape that grows in both directions. Cells hold small integer symbol codes
+    # (0 is the blank), one byte each when there are at most 256 symbols; position p is stored
+    # at cells[p + origin].
+    def __init__(self, codes=(), wide=False):
+        self.typecode = 'I' if wide else 'B'
+        self.cells = array(self.typecode, codes)
+        self.origin = 0
+
+    def blank_cells(self, count):
+        return array(self.typecode, bytes(count)) if self.typecode == 'B' else array(self.typecode, [0]) * count
+
+    def grow(self, index):
+        # Makes cells[index] exist, doubling the tape on the side it ran off; returns the
+        # index's new value (it shifts when cells are added on the left).
+        size = max(len(self.cells), 64)
+        if index < 0:
+            added = max(size, -index)
+            self.cells[0:0] = self.blank_cells(added)
+            self.origin += added
+            return index + added
+        if index >= len(self.cells):
+            self.cells.extend(self.blank_cells(max(size, index + 1 - len(self.cells))))
+        return index
+
+    def run_length(self, index, delta, mask, limit):
+        # Number of consecutive cells, starting at cells[index] and going in direction delta, whose
+        # codes map to 0 through the 256-byte translate table mask; at most limit. The cells are
+        # checked in C over doubling windows. Past either end the tape is blank, so a run that
+        # reaches an end and has the blank in its set goes on for the whole limit.
+        width = 64
+        with memoryview(self.cells) as view:
+            if delta > 0:
+                pos, end = index, min(len(self.cells), index + limit)
+                while pos < end:
+                    stop = min(pos + width, end)
+                    hit = bytes(view[pos:stop]).translate(mask).find(1)
+                    if hit >= 0:
+                        return pos + hit - index
+                    pos, width = stop, width * 2
+                run = pos - index
+            else:
+                pos, end = index + 1, max(0, index + 1 - limit)
+                while pos > end:
+                    start = max(pos - width, end)
+                    hit = bytes(view[start:pos]).translate(mask).rfind(1)
+                    if hit >= 0:
+                        return index - (start + hit)
+                    pos, width = start, width * 2
+                run = index + 1 - pos
+        return limit if run < limit and mask[0] == 0 else run
+
+    def snapshot(self):
+        # (position of the first non-blank cell, the cells from there to the last non-blank one):
+        # equal snapshots mean equal tapes, wherever the array happens to start.
+        raw, size = self.cells.tobytes(), self.cells.itemsize
+        start = (len(raw) - len(raw.lstrip(b'\0'))) // size
+        end = -(-len(raw.rstrip(b'\0')) // size)
+        return (start - self.origin if end else 0), raw[start * size:end * size]
+
+    def read(self, position):
+        index = position + self.origin
+        return self.cells[index] if 0 <= index < len(self.cells) else 0
+
+    def write(self, position, code):
+        index = self.grow(position + self.origin)
+        self.cells[index] = code
+
+    def contents(self, symbols, blank=0):
+        # Tape contents as a string, without the blank cells at either end.
+        codes = self.cells.tolist()
+        start, end = 0, len(codes)
+        while start < end and codes[start] == blank:
+            start += 1
+        while end > start and codes[end - 1] == blank:
+            end -= 1
+        return ''.join(symbols[code] for code in codes[start:end])
+
+
+class CompiledTM:
+    # Integer form of a TuringMachine, built once by TuringMachine.compile():
+    #   states  - working states 0..halt_from-1 (start first when it is one), then accept, then reject
+    #   symbols - tape symbols by code, blank = 0
+    #   table   - entry [state * width + code] is (next_state, write_code, head_delta), or None
+    #             when it is a sweep or the machine has no transition (the run rejects)
+    #   sweeps  - entry [state * width + code] is (head_delta, mask) when the state rewrites the
+    #             symbol unchanged and moves on in the same state; the run then repeats over every
+    #             following cell whose code has mask[code] == 0, and is taken as one macro-step
+    #   right_rows, blank_moves - set when the machine only moves right or stays (see _right_moving)
+    def __init__(self, machine):
+        working = sorted((s for s in machine.states | set(machine.transitions)
+                          if s not in (machine.accept_state, machine.reject_state)),
+                         key=lambda s: (s != machine.start_state, str(s)))
+        self.halt_from = len(working)
+        self.states = working + [machine.accept_state]
+        if machine.reject_state != machine.accept_state:
+            self.states.append(machine.reject_state)
+        self.state_code = {state: code for code, state in enumerate(self.states)}
+        self.accept = self.state_code[machine.accept_state]
+        self.reject = self.state_code[machine.reject_state]
+        self.start = self.state_code[machine.start_state]
+
+        self.symbols = _tape_symbols(machine, ((symbol_read, symbol_to_write)
+                                               for rules in machine.transitions.values()
+                                               for symbol_read, (_, symbol_to_write, _) in rules.items()))
+        self.symbol_code = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self.input_code = {symbol: self.symbol_code[symbol] for symbol in machine.input_alphabet}
+        self.wide = len(self.symbols) > 256
+        self.width = len(self.symbols)
+
+        self.table = [None] * (self.halt_from * self.width)
+        for state_from, rules in machine.transitions.items():
+            code_from = self.state_code[state_from]
+            if code_from >= self.halt_from:  # halting states never read the tape
+                continue
+            for symbol_read, (state_to, symbol_to_write, direction) in rules.items():
+                self.table[code_from * self.width + self.symbol_code[symbol_read]] = (
+                    self.state_code[state_to], self.symbol_code[symbol_to_write], _HEAD_DELTA[direction])
+
+        self.right_rows = self.blank_moves = None
+        if all(direction in ('R', 'S') for state, rules in machine.transitions.items()
+               if self.state_code[state] < self.halt_from for _, _, direction in rules.values()):
+            self._compile_right_moving()
+
+        # Sweeps are taken out of the table so ordinary steps pay nothing for them; they need the
+        # one-byte cells that Tape.run_length scans.
+        self.sweeps = [None] * len(self.table)
+        if not self.wide:
+            for state in range(self.halt_from):
+                base = state * self.width
+                for delta in (-1, 1):
+                    looping = [code for code in range(self.width)
+                               if self.table[base + code] == (state, code, delta)]
+                    mask = bytearray([1]) * 256
+                    for code in looping:
+                        mask[code] = 0
+                    for code in looping:
+                        self.sweeps[base + code] = (delta, bytes(mask))
+                        self.table[base + code] = None
+
+    def _compile_right_moving(self):
+        # A machine that never moves left never reads a cell it has left, so it is a finite
+        # automaton over the input: each cell is handled by one "cell move" that follows the stay
+        # transitions on it until the head moves right or the run ends there. A cell move is
+        # (next_state, steps); next_state can also be missing (no transition: reject) or spin
+        # (stays on the cell forever). right_rows[state] maps input characters to cell moves and
+        # blank_moves[state] is the cell move on a blank cell.
+        self.missing, self.spin = len(self.states), len(self.states) + 1
+        moves = []
+        for key in range(len(self.table)):
+            state, code, steps, seen = key // self.width, key % self.width, 0, set()
+            while True:
+                if state >= self.halt_from:
+                    break
+                entry = self.table[state * self.width + code]
+                if entry is None:
+                    state = self.missing
+                    break
+                if (state, code) in seen:
+                    state = self.spin
+                    break
+                seen.add((state, code))
+                state, code, delta = entry
+                steps += 1
+                if delta:
+                    break
+            moves.append((state, steps))
+        self.right_rows = [{char: moves[base + code] for char, code in self.input_code.items()}
+                           for base in range(0, len(moves), self.width)]
+        self.blank_moves = moves[::self.width]
+
+    def tape(self, input_string):
+        # Tape holding the input, or None if it has a symbol outside the input alphabet.
+        try:
+            return Tape(map(self.input_code.__getitem__, input_string), wide=self.wide)
+        except KeyError:
+            return None
+
+
+_HEAD_DELTA = {'L': -1, 'S': 0, 'R': 1}
+
+
+def _tape_symbols(machine, reads_and_writes):
+    # Tape symbols as small ints, blank first; symbols only written by transitions count too.
+    symbols = {machine.blank_symbol: None}
+    for symbol in sorted(machine.tape_alphabet | machine.input_alphabet, key=str):
+        symbols[symbol] = None
+    for symbol_read, symbol_to_write in reads_and_writes:
+        symbols[symbol_read] = symbols[symbol_to_write] = None
+    return list(symbols)
+
 
 class TuringMachine:
     def __init__(self, states, input_alphabet, tape_alphabet, transitions,
@@ -11,60 +224,638 @@ class TuringMachine:
         self.accept_state = accept_state
         self.reject_state = reject_state
         self.blank_symbol = blank_symbol
+        self._compiled = None
+        self.compile()
 
+    def compile(self):
+        # Validates the machine and builds its integer transition table once; every run reuses it,
+        # so the checks are never repeated per simulation.
+        if self._compiled is not None:
+            return self._compiled
         for state_from, rules in self.transitions.items():
             if state_from not in self.states:
                 raise ValueError(f"State '{state_from}' in transitions is not in defined states.")
-            for symbol_read, (state_to, _, _) in rules.items():
+            for symbol_read, (state_to, _, direction) in rules.items():
                 if state_to not in self.states:
                     raise ValueError(f"State '{state_to}' in transition from '{state_from}' "
                                      f"on '{symbol_read}' is not in defined states.")
+                if direction not in _HEAD_DELTA:
+                    raise ValueError(f"Invalid direction '{direction}' in transition.")
+        self._compiled = CompiledTM(self)
+        return self._compiled
 
     def _initialize_tape(self, input_string):
-        tape = {}
-        for i, char in enumerate(input_string):
-            if char not in self.input_alphabet:
-                raise ValueError(f"Input symbol '{char}' not in input alphabet.")
-            tape[i] = char
+        tape = self.compile().tape(input_string)
+        if tape is None:
+            bad = next(char for char in input_string if char not in self.input_alphabet)
+            raise ValueError(f"Input symbol '{bad}' not in input alphabet.")
         return tape
 
     def simulate(self, input_string, max_steps=1000):
-        if input_string and not all(c in self.input_alphabet for c in input_string):
-             # print(f"Error: Input string '{input_string}' contains symbols not in the input alphabet.")
-             return False
+        return self.evaluate(input_string, max_steps, detect_loops=False) is Result.ACCEPT
 
-        tape = self._initialize_tape(input_string)
-        current_state = self.start_state
-        head_position = 0
-        steps = 0
+    def evaluate(self, input_string, max_steps=1000, detect_loops=True):
+        # Like simulate, but tells why a run did not accept. With detect_loops, a run that comes
+        # back to an earlier configuration (or sweeps into blank tape forever) ends with LOOP
+        # instead of using up the budget. max_steps=None means no step limit.
+        machine = self.compile()
+        max_steps = _UNBOUNDED if max_steps is None else max_steps
+        if machine.right_rows is not None:
+            if not self.input_alphabet.issuperset(input_string):
+                return Result.REJECT
+            return _execute_right_moving(machine, input_string, max_steps, detect_loops)
+        tape = machine.tape(input_string)
+        if tape is None:  # symbols outside the input alphabet
+            return Result.REJECT
+        execute = _execute_detecting_loops if detect_loops else _execute
+        return execute(machine, tape, machine.start, 0, 0, max_steps)[0]
 
-        while steps < max_steps:
-            if current_state == self.accept_state:
-                return True
-            if current_state == self.reject_state:
-                return False
+    def stream(self, max_steps=None):
+        # Incremental run over input arriving in chunks, for machines that only move right or
+        # stay (the tape behind the head is never needed, so nothing is kept but the state).
+        return TMStream(self, max_steps)
+
+    def start(self, input_string):
+        # A paused run at step 0, to be advanced with Run.step / Run.run_until.
+        return Run(self, input_string)
 
-            current_symbol_on_tape = tape.get(head_position, self.blank_symbol)
+    def simulate_many(self, inputs, max_steps=1000, workers=None, chunksize=256, ordered=True):
+        # simulate() over an iterable of inputs in a process pool. The machine (already compiled)
+        # is sent to each worker once; inputs go out in chunks, with at most two chunks per worker
+        # in flight, so memory stays bounded however long the iterable is. Yields the results in
+        # input order, or with ordered=False (index, result) pairs as chunks complete. The
+        # arguments are checked here, before the first result is asked for.
+        if chunksize < 1:
+            raise ValueError("chunksize must be positive")
+        self.compile()
+        return self._simulate_many(inputs, max_steps, workers, chunksize, ordered)
 
-            if current_state not in self.transitions or \
-               current_symbol_on_tape not in self.transitions[current_state]:
-                return False
+    def _simulate_many(self, inputs, max_steps, workers, chunksize, ordered):
+        chunks = _chunks(inputs, chunksize)
+        if workers == 1:
+            for start, chunk in chunks:
+                results = [self.simulate(s, max_steps) for s in chunk]
+                yield from (results if ordered else enumerate(results, start))
+            return
+        workers = workers or os.cpu_count() or 1
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self,)) as pool:
+            if ordered:
+                pending = deque()
+                for start, chunk in chunks:
+                    pending.append(pool.apply_async(_simulate_chunk, (chunk, max_steps)))
+                    if len(pending) >= 2 * workers:
+                        yield from pending.popleft().get()
+                while pending:
+                    yield from pending.popleft().get()
+                return
+            done, in_flight = queue.Queue(), 0
+            for start, chunk in chunks:
+                pool.apply_async(_simulate_chunk, (chunk, max_steps, start),
+                                 callback=done.put, error_callback=done.put)
+                in_flight += 1
+                while in_flight >= 2 * workers or (in_flight and not done.empty()):
+                    yield from _completed(done.get())
+                    in_flight -= 1
+            for _ in range(in_flight):
+                yield from _completed(done.get())
 
-            new_state, symbol_to_write, direction = self.transitions[current_state][current_symbol_on_tape]
+    def profile(self, input_string, max_steps=1000):
+        # Runs like evaluate(detect_loops=False) on a separate, instrumented loop (simulate and
+        # evaluate stay uninstrumented) and returns a RunStats. Sweeps are taken step by step here
+        # so that every counted step is a real one.
+        started = time.perf_counter()
+        machine = self.compile()
+        tape = machine.tape(input_string)
+        if tape is None:
+            tape = Tape()
+            result, state, steps, counts, low, high = Result.REJECT, machine.start, 0, {}, 0, 0
+        else:
+            max_steps = _UNBOUNDED if max_steps is None else max_steps
+            result, state, steps, counts, low, high = _execute_profiled(machine, tape, max_steps)
+        return RunStats(machine, result, state, steps, counts, low, high, len(tape.cells),
+                        time.perf_counter() - started)
 
-            tape[head_position] = symbol_to_write
-            current_state = new_state
 
-            if direction == 'R':
-                head_position += 1
-            elif direction == 'L':
-                head_position -= 1
-            elif direction == 'S':
-                pass
+class TMStream:
+    # feed(chunk) consumes the next piece of input (str, or bytes read as latin-1); result() ends
+    # the input and returns the Result that evaluate() would give for the whole concatenation.
+    def __init__(self, tm, max_steps=None):
+        self.tm = tm
+        self.machine = tm.compile()
+        if self.machine.right_rows is None:
+            raise ValueError("Only machines that move right or stay can be streamed.")
+        self.max_steps = _UNBOUNDED if max_steps is None else max_steps
+        self.state, self.steps = self.machine.start, 0
+        self.consumed = 0
+        self.invalid = False
+
+    def feed(self, chunk):
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = bytes(chunk).decode('latin-1')
+        self.consumed += len(chunk)
+        if not self.invalid:
+            if not self.tm.input_alphabet.issuperset(chunk):
+                self.invalid = True  # rejected whatever the machine would have done
             else:
-                raise ValueError(f"Invalid direction '{direction}' in transition.")
+                self.state, self.steps = _scan_right_moving(self.machine, self.state, self.steps,
+                                                            chunk, self.max_steps)
+        return self
+
+    def result(self, detect_loops=True):
+        if self.invalid:
+            return Result.REJECT
+        return _finish_right_moving(self.machine, self.state, self.steps, self.max_steps, detect_loops)
+
+
+class Run:
+    # A run that can be advanced a slice at a time and saved to / restored from bytes.
+    # step(n) and run_until(budget) return the Result so far: ACCEPT or REJECT once the machine
+    # has halted, BUDGET_EXHAUSTED while it is paused. Running in slices gives exactly the result
+    # and step count of one simulate() call with the same total budget.
+    _HEADER = struct.Struct('<4sIQIqqB')  # magic, machine checksum, steps, state, head, tape start, cell size
+    _MAGIC = b'TMR1'
+
+    def __init__(self, tm, input_string=''):
+        self.tm = tm
+        self.machine = tm.compile()
+        self.tape = self.machine.tape(input_string)
+        self.state, self.index, self.steps = self.machine.start, 0, 0
+        self.result = None if self.tape is not None else Result.REJECT
+        if self.tape is None:
+            self.tape = Tape(wide=self.machine.wide)
+
+    @property
+    def state_name(self):
+        return self.machine.states[self.state]
+
+    @property
+    def head(self):
+        return self.index - self.tape.origin
+
+    @property
+    def halted(self):
+        return self.result is not None
+
+    def step(self, n=1):
+        return self.run_until(self.steps + n)
+
+    def run_until(self, budget):
+        # Runs until the machine halts or `budget` steps have been taken in total.
+        if self.result is not None:
+            return self.result
+        result, self.state, self.index, self.steps = _execute(
+            self.machine, self.tape, self.state, self.index, self.steps, budget)
+        if result is not Result.BUDGET_EXHAUSTED:
+            self.result = result
+        return result
+
+    def snapshot(self):
+        # The full configuration as bytes: a fixed header plus the non-blank stretch of the tape,
+        # zlib-compressed. The checksum ties it to this machine's compiled table.
+        first, cells = self.tape.snapshot()
+        result = b'' if self.result is None else self.result.value.encode()
+        header = self._HEADER.pack(self._MAGIC, _checksum(self.machine), self.steps, self.state,
+                                   self.head, first, self.tape.cells.itemsize)
+        return header + bytes([len(result)]) + result + zlib.compress(cells, 1)
+
+    @classmethod
+    def restore(cls, tm, data):
+        machine = tm.compile()
+        try:
+            magic, checksum, steps, state, head, first, itemsize = cls._HEADER.unpack_from(data)
+            offset = cls._HEADER.size
+            result = bytes(data[offset + 1:offset + 1 + data[offset]]).decode()
+            cells = zlib.decompress(data[offset + 1 + data[offset]:])
+        except (struct.error, IndexError, UnicodeDecodeError, zlib.error) as error:
+            raise ValueError(f"Corrupt run snapshot: {error}.") from None
+        if magic != cls._MAGIC:
+            raise ValueError("Not a run snapshot.")
+        if checksum != _checksum(machine) or itemsize != (4 if machine.wide else 1):
+            raise ValueError("Run snapshot belongs to a different machine.")
+        run = cls(tm)
+        run.tape = Tape(wide=machine.wide)
+        run.tape.cells.frombytes(cells)
+        run.tape.origin = -first
+        run.state, run.index, run.steps = state, head - first, steps
+        run.result = Result(result) if result else None
+        return run
+
+
+def _checksum(machine):
+    return zlib.crc32(repr((machine.states, machine.symbols, machine.table, machine.sweeps)).encode())
+
+
+# The machine used by _simulate_chunk in pool workers, installed once per process by _init_worker.
+_worker_tm = None
+
+
+def _init_worker(tm):
+    global _worker_tm
+    _worker_tm = tm
+
+
+def _chunks(inputs, size):
+    # (index of the first input, list of inputs) for consecutive slices of the iterable.
+    iterator, start = iter(inputs), 0
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _simulate_chunk(chunk, max_steps, start=None):
+    results = [_worker_tm.simulate(s, max_steps) for s in chunk]
+    return results if start is None else list(enumerate(results, start))
+
+
+def _completed(outcome):
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+class RunStats:
+    # Where a profiled run spent its steps:
+    #   result, steps, final_state     - how the run ended
+    #   transitions                    - {(state, symbol read): steps taken with that transition}
+    #   states, symbols                - steps per state and per tape symbol read
+    #   head_min, head_max             - head excursion, as tape positions (the input starts at 0)
+    #   tape_cells                     - cells allocated at the end of the run (the tape only grows)
+    #   wall_time                      - seconds, including compiling and loading the tape
+    def __init__(self, machine, result, state, steps, counts, low, high, tape_cells, wall_time):
+        self.result = result
+        self.steps = steps
+        self.final_state = machine.states[state]
+        self.transitions = {}
+        self.states = {}
+        self.symbols = {}
+        for key, count in counts.items():
+            state_name, symbol = machine.states[key // machine.width], machine.symbols[key % machine.width]
+            self.transitions[state_name, symbol] = count
+            self.states[state_name] = self.states.get(state_name, 0) + count
+            self.symbols[symbol] = self.symbols.get(symbol, 0) + count
+        self.head_min = low
+        self.head_max = high
+        self.tape_cells = tape_cells
+        self.wall_time = wall_time
+
+    def as_dict(self):
+        # Plain values only, ready for a metrics sink or json.dumps.
+        return {
+            'result': self.result.value,
+            'steps': self.steps,
+            'final_state': self.final_state,
+            'transitions': [{'state': state, 'symbol': symbol, 'count': count}
+                            for (state, symbol), count in self.transitions.items()],
+            'states': dict(self.states),
+            'symbols': dict(self.symbols),
+            'head_min': self.head_min,
+            'head_max': self.head_max,
+            'tape_cells': self.tape_cells,
+            'wall_time': self.wall_time,
+        }
+
+
+def _execute_profiled(machine, tape, max_steps):
+    # _execute with counters; returns (result, state, steps, counts per table key, head min, head max).
+    cells, table, width, halt_from = tape.cells, machine.table, machine.width, machine.halt_from
+    sweeps = machine.sweeps
+    state, index, steps = machine.start, 0, 0
+    counts = [0] * len(table)
+    low = high = 0
+    result = Result.BUDGET_EXHAUSTED
+    while steps < max_steps:
+        if state >= halt_from:
+            result = _halted(machine, state)
+            break
+        if not 0 <= index < len(cells):
+            index = tape.grow(index)
+        code = cells[index]
+        key = state * width + code
+        entry = table[key]
+        if entry is None:
+            if sweeps[key] is None:
+                result = Result.REJECT
+                break
+            entry = (state, code, sweeps[key][0])
+        counts[key] += 1
+        state, cells[index], delta = entry
+        index += delta
+        steps += 1
+        position = index - tape.origin
+        if position < low:
+            low = position
+        elif position > high:
+            high = position
+    return result, state, steps, {key: count for key, count in enumerate(counts) if count}, low, high
+
+
+def _halted(machine, state):
+    return Result.ACCEPT if state == machine.accept else Result.REJECT
+
+
+def _execute_right_moving(machine, input_string, max_steps, detect_loops):
+    # Finite-automaton run of a machine that only moves right or stays (see
+    # CompiledTM._compile_right_moving): one cell move per input character, then cell moves on
+    # blanks, with no tape at all. A run ending after `steps` steps counts only if
+    # steps < max_steps, exactly as in _execute.
+    state, steps = _scan_right_moving(machine, machine.start, 0, input_string, max_steps)
+    return _finish_right_moving(machine, state, steps, max_steps, detect_loops)
+
+
+def _scan_right_moving(machine, state, steps, chars, max_steps):
+    # Cell moves over input characters until they run out, the run ends or the budget does.
+    rows, halt_from = machine.right_rows, machine.halt_from
+    if state < halt_from and steps < max_steps:
+        for char in chars:
+            state, cost = rows[state][char]
+            steps += cost
+            if state >= halt_from or steps >= max_steps:
+                break
+    return state, steps
+
+
+def _finish_right_moving(machine, state, steps, max_steps, detect_loops):
+    halt_from = machine.halt_from
+    if state < halt_from and steps < max_steps:
+        # Past the input every cell is blank: the states either reach an end or repeat.
+        seen = set()
+        while state < halt_from and steps < max_steps and state not in seen:
+            seen.add(state)
+            state, cost = machine.blank_moves[state]
+            steps += cost
+        if state < halt_from and state in seen:
+            return Result.LOOP if detect_loops else Result.BUDGET_EXHAUSTED
+    if state == machine.spin:
+        return Result.LOOP if detect_loops else Result.BUDGET_EXHAUSTED
+    if state < halt_from or steps >= max_steps:
+        return Result.BUDGET_EXHAUSTED
+    return Result.ACCEPT if state == machine.accept else Result.REJECT
+
+
+def _execute(machine, tape, state, index, steps, max_steps):
+    # Runs from the given configuration (index = head position + tape.origin) until the machine
+    # halts or steps reaches max_steps; returns (result, state, index, steps).
+    # The head may rest far beyond the tape after a sweep over blanks. Cells out there are read as
+    # blanks and only allocated when something else than a sweep further out comes next.
+    cells, table, width, halt_from = tape.cells, machine.table, machine.width, machine.halt_from
+    sweeps = machine.sweeps
+    while steps < max_steps:
+        if state >= halt_from:
+            return _halted(machine, state), state, index, steps
+        if 0 <= index < len(cells):
+            key = state * width + cells[index]
+        else:
+            key = state * width
+            sweep = sweeps[key]
+            if sweep is None or (sweep[0] > 0) != (index > 0):
+                index = tape.grow(index)
+        entry = table[key]
+        if entry is None:
+            sweep = sweeps[key]
+            if sweep is None:
+                return Result.REJECT, state, index, steps
+            # The cells of the run are left as they are; each one counts as a step.
+            delta, mask = sweep
+            run = tape.run_length(index, delta, mask, max_steps - steps)
+            index += delta * run
+            steps += run
+            continue
+        state, cells[index], delta = entry
+        index += delta
+        steps += 1
+    return Result.BUDGET_EXHAUSTED, state, index, steps
+
+
+def _execute_detecting_loops(machine, tape, state, index, steps, max_steps):
+    # _execute plus Brent's cycle detection: the configuration is saved at steps that double
+    # in distance, and every later configuration is compared with the saved one (state and head
+    # first, the tape only when those match). Memory stays at one tape copy.
+    cells, table, width, halt_from = tape.cells, machine.table, machine.width, machine.halt_from
+    sweeps = machine.sweeps
+    mark_state, mark_head, mark_tape = state, index - tape.origin, tape.snapshot()
+    power, distance = 1, 0
+    while steps < max_steps:
+        if state >= halt_from:
+            return _halted(machine, state), state, index, steps
+        if not 0 <= index < len(cells):
+            index = tape.grow(index)
+        key = state * width + cells[index]
+        entry = table[key]
+        if entry is None:
+            sweep = sweeps[key]
+            if sweep is None:
+                return Result.REJECT, state, index, steps
+            delta, mask = sweep
+            run = tape.run_length(index, delta, mask, max_steps - steps)
+            index += delta * run
+            steps += run
+            if mask[0] == 0 and not 0 <= index < len(cells):
+                return Result.LOOP, state, index, steps  # only blanks lie ahead, and it sweeps them
+        else:
+            state, cells[index], delta = entry
+            index += delta
             steps += 1
-        return False
+        distance += 1
+        if state == mark_state and index - tape.origin == mark_head and tape.snapshot() == mark_tape:
+            return Result.LOOP, state, index, steps
+        if distance == power:
+            mark_state, mark_head, mark_tape = state, index - tape.origin, tape.snapshot()
+            power, distance = power * 2, 0
+    return Result.BUDGET_EXHAUSTED, state, index, steps
+
+
+class NondeterministicTM:
+    # Turing machine whose transitions[state][symbol] is a list of (state, write, direction)
+    # choices (a single tuple is also accepted). It accepts when some branch reaches the accept
+    # state within max_steps steps, found by a breadth-first search over configurations.
+    # Tapes are hash-consed: each distinct tape content is stored once as an immutable
+    # (first position, cells) pair, so a configuration is a small tuple and every configuration
+    # is expanded at most once, however many branches lead to it.
+    def __init__(self, states, input_alphabet, tape_alphabet, transitions,
+                 start_state, accept_state, reject_state, blank_symbol='⊔'):
+        self.states = set(states)
+        self.input_alphabet = set(input_alphabet)
+        self.tape_alphabet = set(tape_alphabet)
+        self.transitions = transitions
+        self.start_state = start_state
+        self.accept_state = accept_state
+        self.reject_state = reject_state
+        self.blank_symbol = blank_symbol
+        self._compiled = False
+        self.compile()
+
+    def compile(self):
+        # Validates the machine once and encodes it: self._choices[state][code] is a tuple of
+        # (next_state, write_code, head_delta) choices, with the same state and symbol
+        # numbering as CompiledTM.
+        if self._compiled:
+            return self
+        choices = {}
+        for state_from, rules in self.transitions.items():
+            if state_from not in self.states:
+                raise ValueError(f"State '{state_from}' in transitions is not in defined states.")
+            for symbol_read, options in rules.items():
+                options = [options] if isinstance(options, tuple) else list(options)
+                for state_to, _, direction in options:
+                    if state_to not in self.states:
+                        raise ValueError(f"State '{state_to}' in transition from '{state_from}' "
+                                         f"on '{symbol_read}' is not in defined states.")
+                    if direction not in _HEAD_DELTA:
+                        raise ValueError(f"Invalid direction '{direction}' in transition.")
+                choices[state_from, symbol_read] = options
+        self.symbols = _tape_symbols(self, ((read, write) for (_, read), options in choices.items()
+                                            for _, write, _ in options))
+        symbol_code = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self._input_code = {symbol: symbol_code[symbol] for symbol in self.input_alphabet}
+        self._wide = len(self.symbols) > 256
+        self._choices = {}
+        for (state_from, symbol_read), options in choices.items():
+            self._choices.setdefault(state_from, {})[symbol_code[symbol_read]] = tuple(
+                (state_to, symbol_code[write], _HEAD_DELTA[direction]) for state_to, write, direction in options)
+        self._compiled = True
+        return self
+
+    def simulate(self, input_string, max_steps=1000, max_frontier=100000):
+        return self.evaluate(input_string, max_steps, max_frontier) is Result.ACCEPT
+
+    def evaluate(self, input_string, max_steps=1000, max_frontier=100000):
+        # ACCEPT if some branch accepts; REJECT if every branch halts without accepting; LOOP if
+        # no branch accepts and some branch revisits one of its own earlier configurations;
+        # BUDGET_EXHAUSTED when the search reaches max_steps or a frontier larger than
+        # max_frontier. Branches that merge into a shared configuration are not a loop: a
+        # repeat only counts when it points no deeper than the configuration that reached it,
+        # and then the explored configuration graph is checked for an actual cycle.
+        self.compile()
+        try:
+            codes = [self._input_code[char] for char in input_string]
+        except KeyError:
+            return Result.REJECT
+        max_steps = _UNBOUNDED if max_steps is None else max_steps
+        tapes = {}
+        tape = _trimmed_tape(0, bytes(codes) if not self._wide else tuple(codes))
+        start = (self.start_state, 0, tapes.setdefault(tape, tape))
+        frontier, seen, graph, looped, depth = [start], {start: 0}, {}, False, 0
+        while depth < max_steps:
+            successors = []
+            for current in frontier:
+                state, head, tape = current
+                if state == self.accept_state:
+                    return Result.ACCEPT
+                if state == self.reject_state:
+                    continue
+                first, cells = tape
+                offset = head - first
+                code = cells[offset] if 0 <= offset < len(cells) else 0
+                targets = graph[current] = []
+                for state_to, write, delta in self._choices.get(state, {}).get(code, ()):
+                    new_tape = tape if write == code else _written_tape(tape, head, write, self._wide)
+                    configuration = (state_to, head + delta, tapes.setdefault(new_tape, new_tape))
+                    targets.append(configuration)
+                    if configuration in seen:
+                        # A configuration first reached at the next depth is a merge of two
+                        # branches; one reached no deeper than this one may close a cycle.
+                        looped = looped or seen[configuration] <= depth
+                        continue
+                    seen[configuration] = depth + 1
+                    successors.append(configuration)
+            if not successors:
+                return Result.LOOP if looped and _has_cycle(graph, start) else Result.REJECT
+            if len(successors) > max_frontier:
+                return Result.BUDGET_EXHAUSTED
+            frontier = successors
+            depth += 1
+        return Result.BUDGET_EXHAUSTED
+
+
+def _has_cycle(graph, start):
+    # Iterative depth-first search over graph[configuration] -> successor list; True when a
+    # successor is still on the search path. Configurations missing from graph were never
+    # expanded (halting states) and have no successors.
+    on_path, done = {start}, set()
+    stack = [(start, iter(graph.get(start, ())))]
+    while stack:
+        node, successors = stack[-1]
+        for successor in successors:
+            if successor in on_path:
+                return True
+            if successor not in done:
+                on_path.add(successor)
+                stack.append((successor, iter(graph.get(successor, ()))))
+                break
+        else:
+            stack.pop()
+            on_path.discard(node)
+            done.add(node)
+    return False
+
+
+def _trimmed_tape(first, cells):
+    # (first, cells) with the blank cells at both ends dropped; an all-blank tape is (0, empty).
+    start, end = 0, len(cells)
+    while start < end and cells[start] == 0:
+        start += 1
+    while end > start and cells[end - 1] == 0:
+        end -= 1
+    if start == end:
+        return 0, cells[:0]
+    return first + start, cells[start:end]
+
+
+def _written_tape(tape, position, code, wide):
+    first, cells = tape
+    cell = (code,) if wide else bytes([code])
+    blank = (0,) if wide else b'\0'
+    if not cells:
+        return _trimmed_tape(position, cell)
+    offset = position - first
+    if offset < 0:
+        cells = cell + blank * (-offset - 1) + cells
+        first = position
+    elif offset >= len(cells):
+        cells = cells + blank * (offset - len(cells)) + cell
+    else:
+        cells = cells[:offset] + cell + cells[offset + 1:]
+        if code == 0 and (offset == 0 or offset == len(cells) - 1):
+            return _trimmed_tape(first, cells)
+    return first, cells
+
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def create_divisibility_tm(k, base=2):
+    # Remainder machine for "the base-`base` number on the tape is divisible by k": state q_rem{r}
+    # holds the value read so far mod k and digit d moves it to q_rem{(r * base + d) % k}, so
+    # every digit costs one table step whatever the length of the number. Digits are 0-9 then
+    # a-z; create_divisibility_tm(3) is the same machine as create_divisible_by_3_tm().
+    if not 2 <= base <= len(_DIGITS):
+        raise ValueError(f"Base must be between 2 and {len(_DIGITS)}.")
+    if k < 1:
+        raise ValueError("The modulus k must be positive.")
+    digits = _DIGITS[:base]
+    blank_symbol = '⊔'
+    remainders = [f'q_rem{r}' for r in range(k)]
+    transitions = {}
+    for r, state in enumerate(remainders):
+        rules = {d: (remainders[(r * base + value) % k], d, 'R') for value, d in enumerate(digits)}
+        rules[blank_symbol] = ('q_accept' if r == 0 else 'q_reject', blank_symbol, 'S')
+        transitions[state] = rules
+    return TuringMachine(set(remainders) | {'q_accept', 'q_reject'}, set(digits), set(digits) | {blank_symbol},
+                         transitions, 'q_rem0', 'q_accept', 'q_reject', blank_symbol)
+
+
+def is_divisible(chunks, k, base=2):
+    # Streams the digits (an iterable of str or bytes chunks) through the remainder machine.
+    # Letter digits may be either case, as with int(); anything else raises ValueError.
+    stream = create_divisibility_tm(k, base).stream()
+    for chunk in chunks:
+        stream.feed(chunk.lower())
+        if stream.invalid:
+            raise ValueError(f"Invalid digit in base {base} number: {chunk!r}")
+    return stream.result() is Result.ACCEPT
 
 
 def create_divisible_by_3_tm():